@@ -0,0 +1,44 @@
+"""
+Gunicorn configuration for the Flask webhook server
+
+Webhook handling is I/O-bound (Supabase and Stripe over HTTPS), so gevent
+workers serve many deliveries concurrently instead of one at a time.
+
+Usage:
+    gunicorn webhooks.app:app -c gunicorn.conf.py
+"""
+
+import multiprocessing
+import os
+import shutil
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gevent'
+worker_connections = 1000
+keepalive = 75
+timeout = 30
+
+# Prometheus multiprocess mode: workers write their samples to this directory
+# and the master aggregates them (set here, before the app imports prometheus_client)
+prometheus_multiproc_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/nexus-webhook-metrics')
+metrics_port = int(os.getenv('WEB_METRICS_PORT', '9101'))
+
+
+def on_starting(server):
+    # Drop samples left by a previous run
+    shutil.rmtree(prometheus_multiproc_dir, ignore_errors=True)
+    os.makedirs(prometheus_multiproc_dir, exist_ok=True)
+
+
+def when_ready(server):
+    # /metrics on an internal port, separate from the public webhook port
+    from prometheus_client import CollectorRegistry, multiprocess, start_http_server
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    start_http_server(metrics_port, registry=registry)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -51,6 +51,7 @@ CREATE TABLE public.profiles (
     -- Billing
     stripe_customer_id TEXT UNIQUE,
     stripe_subscription_id TEXT,
+    subscription_status TEXT,
     
     -- Flags
     is_active BOOLEAN NOT NULL DEFAULT true,
@@ -194,6 +195,24 @@ CREATE INDEX idx_scans_user_created ON public.scans(user_id, created_at DESC) WH
 CREATE INDEX idx_scans_domain ON public.scans(domain, created_at DESC);
 CREATE INDEX idx_scans_status ON public.scans(status) WHERE status IN ('pending', 'processing');
 
+-- ----------------------------------------------------------------------------
+-- SEO SCANS (Scan Results Page and Stats Sidebar)
+-- ----------------------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS public.seo_scans (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES public.profiles(id) ON DELETE CASCADE,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending', -- 'pending', 'processing', 'completed', 'failed'
+    seo_score INTEGER CHECK (seo_score BETWEEN 0 AND 100),
+    results JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_seo_scans_user_created ON public.seo_scans(user_id, created_at DESC);
+-- Serves user_scan_stats() from the index alone
+CREATE INDEX IF NOT EXISTS idx_seo_scans_user_completed ON public.seo_scans(user_id)
+    INCLUDE (seo_score) WHERE status = 'completed';
+
 -- ----------------------------------------------------------------------------
 -- AI USAGE TRACKING
 -- ----------------------------------------------------------------------------
@@ -273,6 +292,10 @@ CREATE TABLE public.credit_transactions (
 
 CREATE INDEX idx_credit_transactions_user ON public.credit_transactions(user_id, created_at DESC);
 CREATE INDEX idx_credit_transactions_reference ON public.credit_transactions(reference_id);
+-- One subscription credit grant per paid Stripe invoice
+CREATE UNIQUE INDEX idx_credit_transactions_stripe_invoice
+    ON public.credit_transactions ((metadata->>'stripe_invoice_id'))
+    WHERE metadata ? 'stripe_invoice_id';
 
 -- ----------------------------------------------------------------------------
 -- STRIPE EVENTS (Webhook Idempotency)
@@ -300,6 +323,38 @@ CREATE TABLE public.stripe_events (
 
 CREATE INDEX idx_stripe_events_processed ON public.stripe_events(processed, created_at);
 CREATE INDEX idx_stripe_events_type ON public.stripe_events(type);
+CREATE INDEX idx_stripe_events_unprocessed ON public.stripe_events(id) WHERE NOT processed;
+
+-- ----------------------------------------------------------------------------
+-- WEBHOOK EVENTS (Raw Webhook Audit Log)
+-- ----------------------------------------------------------------------------
+CREATE TABLE public.webhook_events (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    event_id TEXT NOT NULL UNIQUE,
+    event_type TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    processed BOOLEAN NOT NULL DEFAULT false,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX idx_webhook_events_type ON public.webhook_events(event_type);
+
+-- ----------------------------------------------------------------------------
+-- PAYMENTS (Checkout Payments from the Streamlit Webhook Listener)
+-- ----------------------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS public.payments (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID REFERENCES public.profiles(id) ON DELETE CASCADE,
+    stripe_event_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    amount INTEGER NOT NULL DEFAULT 0,
+    credits INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- One row per Stripe event; the direct-Postgres path claims events with
+-- ON CONFLICT (stripe_event_id). Also added to existing payments tables.
+CREATE UNIQUE INDEX IF NOT EXISTS payments_stripe_event_id_key ON public.payments(stripe_event_id);
 
 -- ----------------------------------------------------------------------------
 -- AUDIT LOGS
@@ -377,9 +432,12 @@ CREATE INDEX idx_recommendations_user_status ON public.seo_recommendations(user_
 ALTER TABLE public.profiles ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.subscriptions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.scans ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.seo_scans ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.ai_usage ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.credit_transactions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.stripe_events ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.webhook_events ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.payments ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.audit_logs ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.seo_recommendations ENABLE ROW LEVEL SECURITY;
 
@@ -440,6 +498,14 @@ CREATE POLICY "Users can update own scans"
     ON public.scans FOR UPDATE
     USING (auth.uid() = user_id);
 
+CREATE POLICY "Users can view own seo scans"
+    ON public.seo_scans FOR SELECT
+    USING (auth.uid() = user_id);
+
+CREATE POLICY "Users can delete own seo scans"
+    ON public.seo_scans FOR DELETE
+    USING (auth.uid() = user_id);
+
 CREATE POLICY "Admins can view all scans"
     ON public.scans FOR SELECT
     USING (
@@ -569,18 +635,369 @@ $$ LANGUAGE plpgsql SECURITY DEFINER;
 
 -- Schedule this function to run daily via pg_cron or external scheduler
 
+-- ============================================================================
+-- WEBHOOK RPC FUNCTIONS
+-- ============================================================================
+
+-- ----------------------------------------------------------------------------
+-- Claim a Stripe event for processing (single round-trip idempotency)
+-- Returns the event ID for new or previously failed events, no row if the
+-- event was already processed.
+-- ----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION public.claim_stripe_event(p_event_id TEXT, p_type TEXT, p_data JSONB)
+RETURNS SETOF TEXT AS $$
+    INSERT INTO public.stripe_events (id, type, data)
+    VALUES (p_event_id, p_type, p_data)
+    ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data
+    WHERE public.stripe_events.processed = false
+    RETURNING id;
+$$ LANGUAGE sql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION public.claim_stripe_event(TEXT, TEXT, JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.claim_stripe_event(TEXT, TEXT, JSONB) TO service_role;
+
+-- ----------------------------------------------------------------------------
+-- Record a failed processing attempt for a Stripe event
+-- ----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION public.record_stripe_event_failure(p_event_id TEXT, p_error_message TEXT)
+RETURNS void AS $$
+    UPDATE public.stripe_events
+    SET 
+        retry_count = LEAST(COALESCE(retry_count, 0) + 1, 5),
+        error_message = p_error_message
+    WHERE id = p_event_id;
+$$ LANGUAGE sql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION public.record_stripe_event_failure(TEXT, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.record_stripe_event_failure(TEXT, TEXT) TO service_role;
+
+-- ----------------------------------------------------------------------------
+-- Grant subscription credits to a user and record the credit transaction in
+-- a single transaction. Returns the new credits balance.
+-- ----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION public.grant_credits_atomic(
+    p_user_id UUID,
+    p_amount INTEGER,
+    p_subscription_id TEXT,
+    p_description TEXT
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_balance INTEGER;
+BEGIN
+    UPDATE public.profiles
+    SET 
+        credits_balance = credits_balance + p_amount,
+        total_credits_purchased = total_credits_purchased + p_amount
+    WHERE id = p_user_id
+    RETURNING credits_balance INTO v_balance;
+    
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Profile % not found', p_user_id;
+    END IF;
+    
+    INSERT INTO public.credit_transactions (
+        user_id, type, amount, balance_after, reference_type, description, metadata
+    )
+    VALUES (
+        p_user_id,
+        'subscription_credit',
+        p_amount,
+        v_balance,
+        'subscription',
+        p_description,
+        jsonb_build_object('stripe_subscription_id', p_subscription_id)
+    );
+    
+    RETURN v_balance;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION public.grant_credits_atomic(UUID, INTEGER, TEXT, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.grant_credits_atomic(UUID, INTEGER, TEXT, TEXT) TO service_role;
+
+-- ----------------------------------------------------------------------------
+-- Atomically add credits to the user with a Stripe customer ID. Returns the
+-- new credits balance, NULL if no profile has this customer.
+-- ----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION public.add_credits(p_customer_id TEXT, p_delta INTEGER)
+RETURNS INTEGER AS $$
+    UPDATE public.profiles
+    SET 
+        credits_balance = COALESCE(credits_balance, 0) + p_delta,
+        updated_at = NOW()
+    WHERE stripe_customer_id = p_customer_id
+    RETURNING credits_balance;
+$$ LANGUAGE sql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION public.add_credits(TEXT, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.add_credits(TEXT, INTEGER) TO service_role;
+
+-- ----------------------------------------------------------------------------
+-- Apply a Stripe subscription change to the profile with a customer ID: tier,
+-- status and scan limit in one UPDATE (credits come from paid invoices only).
+-- Returns the user ID, NULL if no profile has this customer.
+-- ----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION public.apply_subscription_update(
+    p_customer_id TEXT,
+    p_subscription_id TEXT,
+    p_status TEXT,
+    p_tier TEXT,
+    p_scan_limit INTEGER
+)
+RETURNS UUID AS $$
+    UPDATE public.profiles
+    SET 
+        stripe_subscription_id = p_subscription_id,
+        subscription_status = p_status,
+        tier = p_tier::user_tier,
+        monthly_scan_limit = COALESCE(p_scan_limit, monthly_scan_limit),
+        updated_at = NOW()
+    WHERE stripe_customer_id = p_customer_id
+    RETURNING id;
+$$ LANGUAGE sql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION public.apply_subscription_update(TEXT, TEXT, TEXT, TEXT, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.apply_subscription_update(TEXT, TEXT, TEXT, TEXT, INTEGER) TO service_role;
+
+-- ----------------------------------------------------------------------------
+-- Grant a paid invoice's subscription credits to the profile with a Stripe
+-- customer ID and record the credit transaction, at most once per invoice.
+-- Returns the credits balance, NULL if no profile has this customer.
+-- ----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION public.grant_invoice_credits(
+    p_customer_id TEXT,
+    p_invoice_id TEXT,
+    p_amount INTEGER,
+    p_description TEXT
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_user_id UUID;
+    v_balance INTEGER;
+BEGIN
+    -- Lock the profile so redeliveries of the same invoice are serialized
+    SELECT id, credits_balance INTO v_user_id, v_balance
+    FROM public.profiles
+    WHERE stripe_customer_id = p_customer_id
+    FOR UPDATE;
+    
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+    
+    IF EXISTS (
+        SELECT 1 FROM public.credit_transactions
+        WHERE metadata->>'stripe_invoice_id' = p_invoice_id
+    ) THEN
+        RETURN v_balance;
+    END IF;
+    
+    UPDATE public.profiles
+    SET 
+        credits_balance = credits_balance + p_amount,
+        total_credits_purchased = total_credits_purchased + p_amount,
+        updated_at = NOW()
+    WHERE id = v_user_id
+    RETURNING credits_balance INTO v_balance;
+    
+    INSERT INTO public.credit_transactions (
+        user_id, type, amount, balance_after, reference_type, description, metadata
+    )
+    VALUES (
+        v_user_id,
+        'subscription_credit',
+        p_amount,
+        v_balance,
+        'subscription',
+        p_description,
+        jsonb_build_object('stripe_invoice_id', p_invoice_id)
+    );
+    
+    RETURN v_balance;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION public.grant_invoice_credits(TEXT, TEXT, INTEGER, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.grant_invoice_credits(TEXT, TEXT, INTEGER, TEXT) TO service_role;
+
+-- ----------------------------------------------------------------------------
+-- Reset a user's monthly scan usage at the start of a billing period
+-- ----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION public.reset_scan_counter(p_user_id UUID)
+RETURNS void AS $$
+    UPDATE public.profiles
+    SET 
+        monthly_scans_used = 0,
+        scan_limit_reset_date = NOW() + INTERVAL '30 days'
+    WHERE id = p_user_id;
+$$ LANGUAGE sql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION public.reset_scan_counter(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.reset_scan_counter(UUID) TO service_role;
+
+-- ----------------------------------------------------------------------------
+-- Complete a checkout: subscription record, tier upgrade, initial credits
+-- and audit log in a single transaction. Returns the new credits balance.
+-- ----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION public.complete_checkout(
+    p_user_id UUID,
+    p_tier TEXT,
+    p_interval TEXT,
+    p_sub JSONB,
+    p_pricing JSONB
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_credits INTEGER := (p_pricing->>'credits')::INTEGER;
+    v_amount INTEGER := (p_pricing->>'amount')::INTEGER;
+    v_balance INTEGER;
+BEGIN
+    INSERT INTO public.subscriptions (
+        user_id, stripe_subscription_id, stripe_customer_id, stripe_price_id,
+        status, tier, currency, amount, interval,
+        current_period_start, current_period_end, trial_start, trial_end
+    )
+    VALUES (
+        p_user_id,
+        p_sub->>'stripe_subscription_id',
+        p_sub->>'stripe_customer_id',
+        p_sub->>'stripe_price_id',
+        (p_sub->>'status')::subscription_status,
+        p_tier::user_tier,
+        p_sub->>'currency',
+        v_amount,
+        p_interval,
+        (p_sub->>'current_period_start')::TIMESTAMPTZ,
+        (p_sub->>'current_period_end')::TIMESTAMPTZ,
+        (p_sub->>'trial_start')::TIMESTAMPTZ,
+        (p_sub->>'trial_end')::TIMESTAMPTZ
+    );
+    
+    UPDATE public.profiles
+    SET 
+        tier = p_tier::user_tier,
+        stripe_subscription_id = p_sub->>'stripe_subscription_id',
+        monthly_scan_limit = (p_pricing->>'scan_limit')::INTEGER,
+        tier_updated_at = NOW(),
+        credits_balance = credits_balance + v_credits,
+        total_credits_purchased = total_credits_purchased + v_credits
+    WHERE id = p_user_id
+    RETURNING credits_balance INTO v_balance;
+    
+    INSERT INTO public.credit_transactions (
+        user_id, type, amount, balance_after, reference_type, description, metadata
+    )
+    VALUES (
+        p_user_id,
+        'subscription_credit',
+        v_credits,
+        v_balance,
+        'subscription',
+        'Initial credits for ' || INITCAP(p_tier) || ' ' || p_interval || 'ly subscription',
+        jsonb_build_object('stripe_subscription_id', p_sub->>'stripe_subscription_id')
+    );
+    
+    INSERT INTO public.audit_logs (user_id, action, resource_type, metadata)
+    VALUES (
+        p_user_id,
+        'subscription_created',
+        'subscription',
+        jsonb_build_object(
+            'tier', p_tier,
+            'interval', p_interval,
+            'amount', v_amount,
+            'stripe_subscription_id', p_sub->>'stripe_subscription_id'
+        )
+    );
+    
+    RETURN v_balance;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION public.complete_checkout(UUID, TEXT, TEXT, JSONB, JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.complete_checkout(UUID, TEXT, TEXT, JSONB, JSONB) TO service_role;
+
+-- ----------------------------------------------------------------------------
+-- Cancel a subscription and downgrade the user to the demo tier
+-- ----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION public.cancel_subscription(p_user_id UUID, p_subscription_id TEXT)
+RETURNS void AS $$
+BEGIN
+    UPDATE public.subscriptions
+    SET 
+        status = 'canceled',
+        ended_at = NOW()
+    WHERE stripe_subscription_id = p_subscription_id;
+    
+    UPDATE public.profiles
+    SET 
+        tier = 'demo',
+        monthly_scan_limit = 2,
+        tier_updated_at = NOW()
+    WHERE id = p_user_id;
+    
+    INSERT INTO public.audit_logs (user_id, action, resource_type, metadata)
+    VALUES (
+        p_user_id,
+        'subscription_canceled',
+        'subscription',
+        jsonb_build_object('stripe_subscription_id', p_subscription_id)
+    );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION public.cancel_subscription(UUID, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.cancel_subscription(UUID, TEXT) TO service_role;
+
+-- Record a webhook event from its raw JSON body (parsed to jsonb server-side).
+-- Returns false if the event was already recorded and processed.
+CREATE OR REPLACE FUNCTION public.insert_webhook_event(p_event_id TEXT, p_event_type TEXT, p_payload TEXT)
+RETURNS BOOLEAN AS $$
+    WITH inserted AS (
+        INSERT INTO public.webhook_events (event_id, event_type, payload)
+        VALUES (p_event_id, p_event_type, p_payload::jsonb)
+        ON CONFLICT (event_id) DO NOTHING
+        RETURNING true
+    )
+    SELECT COALESCE(
+        (SELECT true FROM inserted),
+        NOT (SELECT processed FROM public.webhook_events WHERE event_id = p_event_id)
+    );
+$$ LANGUAGE sql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION public.insert_webhook_event(TEXT, TEXT, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.insert_webhook_event(TEXT, TEXT, TEXT) TO service_role;
+
+-- ============================================================================
+-- DASHBOARD RPC FUNCTIONS
+-- ============================================================================
+
+-- ----------------------------------------------------------------------------
+-- Scan history aggregates for the stats sidebar (one row per call)
+-- ----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION public.user_scan_stats(uid UUID)
+RETURNS TABLE (avg_score INTEGER, total BIGINT) AS $$
+    SELECT avg(seo_score)::int AS avg_score, count(*) AS total
+    FROM public.seo_scans
+    WHERE user_id = uid AND status = 'completed';
+$$ LANGUAGE sql STABLE;
+
 -- ============================================================================
 -- INDEXES FOR PERFORMANCE
 -- ============================================================================
 
 -- Profiles
 CREATE INDEX idx_profiles_email ON public.profiles(email) WHERE deleted_at IS NULL;
-CREATE INDEX idx_profiles_stripe_customer ON public.profiles(stripe_customer_id) WHERE stripe_customer_id IS NOT NULL;
+-- stripe_customer_id lookups use the index behind its UNIQUE constraint
 CREATE INDEX idx_profiles_tier ON public.profiles(tier) WHERE is_active = true;
+-- Covers the sidebar profile lookup so it is served index-only
+CREATE INDEX profiles_sidebar_covering ON public.profiles(id)
+    INCLUDE (tier, credits_balance, monthly_scans_used, monthly_scan_limit);
 
 -- Subscriptions
 CREATE INDEX idx_subscriptions_user ON public.subscriptions(user_id);
-CREATE INDEX idx_subscriptions_stripe_sub ON public.subscriptions(stripe_subscription_id);
+-- stripe_subscription_id lookups use the index behind its UNIQUE constraint
 CREATE INDEX idx_subscriptions_status ON public.subscriptions(status, current_period_end);
 
 -- ============================================================================
@@ -1,14 +1,53 @@
 import os
 import json
+import asyncio
+import threading
+from urllib.parse import urlparse
 import stripe
 import streamlit as st
 from supabase import create_client, Client
 
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
 # --- SUPABASE SETUP ---
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# --- DIRECT POSTGRES (webhook hot path) ---
+# When set, payments/credits writes bypass PostgREST and go through an asyncpg
+# pool whose per-connection statement cache reuses prepared plans.
+# Point this at the Supavisor transaction-mode pooler (port 6543) so workers
+# share backend connections; prepared statements are disabled there because
+# a transaction-mode backend is not pinned to one client.
+DATABASE_URL = os.environ.get("SUPABASE_DB_URL")
+TRANSACTION_POOLER_PORT = 6543
+
+def uses_transaction_pooler(dsn):
+    return urlparse(dsn).port == TRANSACTION_POOLER_PORT
+
+# The pool lives on one event loop running in its own thread; session threads
+# submit coroutines to it with run_on_db() instead of driving the loop themselves
+@st.cache_resource
+def get_db():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="asyncpg-loop", daemon=True).start()
+    statement_cache_size = 0 if uses_transaction_pooler(DATABASE_URL) else 100
+    pool = asyncio.run_coroutine_threadsafe(asyncpg.create_pool(
+        DATABASE_URL, min_size=4, max_size=20, statement_cache_size=statement_cache_size
+    ), loop).result()
+    return loop, pool
+
+def run_on_db(coro_fn, *args):
+    loop, pool = get_db()
+    return asyncio.run_coroutine_threadsafe(coro_fn(pool, *args), loop).result()
+
+def use_direct_db():
+    return bool(DATABASE_URL) and asyncpg is not None
+
 # --- STRIPE SETUP ---
 stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
 endpoint_secret = os.environ.get("STRIPE_WEBHOOK_SECRET")
@@ -30,14 +69,10 @@ def process_event(event):
 
 # --- HELPER FUNCTIONS ---
 def handle_checkout_session(session):
-    # Prevent duplicate
-    existing = supabase.table("payments").select("*").eq("stripe_event_id", session["id"]).execute()
-    if existing.data:
-        return
-
     user_id = session["client_reference_id"]
     amount = session["amount_total"] // 100
     credits = 0
+    tier = None
 
     # Map price_id to credits or tier
     price_id = session["line_items"]["data"][0]["price"]["id"]
@@ -50,6 +85,17 @@ def handle_checkout_session(session):
         credits = 10000
     else:
         tier = "pro" if "PRO" in price_id.upper() else "agency" if "AGENCY" in price_id.upper() else "elite"
+
+    if use_direct_db():
+        run_on_db(record_checkout, session, user_id, amount, credits, tier)
+        return
+
+    # Prevent duplicate
+    existing = supabase.table("payments").select("*").eq("stripe_event_id", session["id"]).execute()
+    if existing.data:
+        return
+
+    if tier:
         supabase.table("profiles").update({
             "tier": tier,
             "subscription_status": "active",
@@ -58,8 +104,8 @@ def handle_checkout_session(session):
         }).eq("id", user_id).execute()
 
     if credits:
-        profile = supabase.table("profiles").select("credits_balance").eq("id", user_id).single().execute()
-        new_credits = profile.data["credits_balance"] + credits
+        profile = supabase.table("profiles").select("credits_balance").eq("id", user_id).limit(1).execute()
+        new_credits = profile.data[0]["credits_balance"] + credits
         supabase.table("profiles").update({"credits_balance": new_credits}).eq("id", user_id).execute()
 
     supabase.table("payments").insert({
@@ -70,6 +116,33 @@ def handle_checkout_session(session):
         "credits": credits
     }).execute()
 
+async def record_checkout(pool, session, user_id, amount, credits, tier):
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            # Claim the event first; a redelivery inserts nothing and stops here
+            inserted = await conn.fetchval(
+                "insert into payments (user_id, stripe_event_id, type, amount, credits) "
+                "values ($1, $2, 'checkout.session.completed', $3, $4) "
+                "on conflict (stripe_event_id) do nothing returning stripe_event_id",
+                user_id, session["id"], amount, credits
+            )
+            if inserted is None:
+                return
+
+            if tier:
+                await conn.execute(
+                    "update profiles set tier = $2, subscription_status = 'active', "
+                    "stripe_subscription_id = $3, current_period_end = $4 where id = $1",
+                    user_id, tier, session.get("subscription"), session.get("current_period_end")
+                )
+
+            if credits:
+                await conn.fetchval(
+                    "update profiles set credits_balance = credits_balance + $2 "
+                    "where id = $1 returning credits_balance",
+                    user_id, credits
+                )
+
 def handle_subscription_deleted(subscription):
     user_id = subscription["metadata"]["user_id"]
     supabase.table("profiles").update({
@@ -52,7 +52,8 @@ def create_products():
             product=pro_product.id,
             unit_amount=4900,  # €49.00
             currency="eur",
-            recurring={"interval": "month"}
+            recurring={"interval": "month"},
+            metadata={"tier": "pro"}
         )
         print(f"✅ Pro Monthly: {pro_monthly.id}")
         
@@ -60,7 +61,8 @@ def create_products():
             product=pro_product.id,
             unit_amount=47000,  # €470.00
             currency="eur",
-            recurring={"interval": "year"}
+            recurring={"interval": "year"},
+            metadata={"tier": "pro"}
         )
         print(f"✅ Pro Annual: {pro_annual.id}\n")
         
@@ -79,7 +81,8 @@ def create_products():
             product=agency_product.id,
             unit_amount=14900,  # €149.00
             currency="eur",
-            recurring={"interval": "month"}
+            recurring={"interval": "month"},
+            metadata={"tier": "agency"}
         )
         print(f"✅ Agency Monthly: {agency_monthly.id}")
         
@@ -87,7 +90,8 @@ def create_products():
             product=agency_product.id,
             unit_amount=143000,  # €1,430.00
             currency="eur",
-            recurring={"interval": "year"}
+            recurring={"interval": "year"},
+            metadata={"tier": "agency"}
         )
         print(f"✅ Agency Annual: {agency_annual.id}\n")
         
@@ -106,7 +110,8 @@ def create_products():
             product=elite_product.id,
             unit_amount=39900,  # €399.00
             currency="eur",
-            recurring={"interval": "month"}
+            recurring={"interval": "month"},
+            metadata={"tier": "elite"}
         )
         print(f"✅ Elite Monthly: {elite_monthly.id}")
         
@@ -114,7 +119,8 @@ def create_products():
             product=elite_product.id,
             unit_amount=430000,  # €4,300.00 (save €488/year)
             currency="eur",
-            recurring={"interval": "year"}
+            recurring={"interval": "year"},
+            metadata={"tier": "elite"}
         )
         print(f"✅ Elite Annual: {elite_annual.id}\n")
         
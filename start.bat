@@ -36,7 +36,7 @@ if errorlevel 1 (
 
 REM Start webhook server in new window
 echo 🎣 Starting webhook server...
-start "Webhook Server" cmd /k "venv\Scripts\activate.bat && python webhook_server.py"
+start "Webhook Server" cmd /k "venv\Scripts\activate.bat && python -m webhooks.app"
 timeout /t 2 /nobreak >nul
 
 REM Start Streamlit in new window
@@ -32,7 +32,7 @@ fi
 # Function to start webhook server
 start_webhook_server() {
     echo "🎣 Starting webhook server on port 8000..."
-    python webhook_server.py &
+    gunicorn webhooks.app:app -c gunicorn.conf.py --bind 0.0.0.0:8000 &
     WEBHOOK_PID=$!
     echo "✅ Webhook server started (PID: $WEBHOOK_PID)"
 }
@@ -4,20 +4,35 @@ Production-grade subscription management with Stripe
 """
 
 import os
+import json
 import stripe
-import hmac
-import hashlib
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional, Tuple
-from datetime import datetime, timedelta
+from datetime import date, datetime, timezone
+from cachetools import TTLCache
 from supabase import Client
+from postgrest.types import ReturnMethod
+from utils.stripe_helpers import create_stripe_http_client, create_supabase_client, verify_stripe_signature
 import logging
 
+try:
+    import redis
+except ImportError:
+    redis = None
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # Stripe configuration
 stripe.api_key = os.getenv('STRIPE_SECRET_KEY')
+
+# Reuse keep-alive connections to the Stripe API across requests
+stripe.default_http_client = create_stripe_http_client()
 STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+# HMAC key, encoded once rather than on every webhook
+STRIPE_WEBHOOK_KEY = STRIPE_WEBHOOK_SECRET.encode('utf-8') if STRIPE_WEBHOOK_SECRET else None
+APP_BASE_URL = os.getenv('APP_BASE_URL', 'http://localhost:8501')
 
 # Pricing configuration (Price IDs from Stripe Dashboard)
 PRICING_CONFIG = {
@@ -59,6 +74,60 @@ PRICING_CONFIG = {
     }
 }
 
+# Pricing never changes at runtime; freeze it so no code path can mutate shared config
+PRICING_CONFIG = MappingProxyType({
+    tier: MappingProxyType({interval: MappingProxyType(cfg) for interval, cfg in intervals.items()})
+    for tier, intervals in PRICING_CONFIG.items()
+})
+
+# Reverse lookup: Stripe price ID -> (tier, interval, pricing)
+PRICE_ID_INDEX = {
+    cfg['price_id']: (tier, interval, cfg)
+    for tier, intervals in PRICING_CONFIG.items()
+    for interval, cfg in intervals.items()
+    if cfg['price_id']
+}
+
+
+def _ts(ts: Optional[int]) -> Optional[str]:
+    """Convert a Stripe Unix timestamp to an ISO-8601 UTC string."""
+    return None if ts is None else datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+# Shared pool for overlapping independent Supabase calls within a webhook
+_io_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='stripe-io')
+
+# Optional Redis for fast webhook de-duplication (Postgres stays the source of truth)
+REDIS_URL = os.getenv('REDIS_URL')
+_redis = redis.Redis.from_url(REDIS_URL) if redis is not None and REDIS_URL else None
+EVENT_DEDUPE_TTL = 86400  # Stripe retries for up to 3 days, duplicates cluster within 24h
+
+# user_id -> stripe_customer_id (rarely changes, saves a profiles SELECT per checkout)
+_customer_cache = TTLCache(maxsize=10_000, ttl=300)
+
+# Webhook event type -> StripeService handler method
+_HANDLER_NAMES = {
+    'checkout.session.completed': '_handle_checkout_completed',
+    'customer.subscription.updated': '_handle_subscription_updated',
+    'customer.subscription.deleted': '_handle_subscription_deleted',
+    'invoice.paid': '_handle_invoice_paid',
+    'invoice.payment_failed': '_handle_payment_failed',
+}
+
+
+def construct_webhook_event(payload: bytes, sig_header: str, secret: bytes) -> stripe.Event:
+    """
+    Verify a webhook signature over the raw payload, then parse it.
+    
+    The JSON body is only parsed once the signature has been verified.
+    
+    Raises:
+        stripe.error.SignatureVerificationError: If the timestamp is stale or the signature does not match
+        ValueError: If the verified payload is not valid JSON
+    """
+    verify_stripe_signature(payload, sig_header, secret)
+    return stripe.Event.construct_from(json.loads(payload), stripe.api_key)
+
 
 class StripeService:
     """
@@ -67,11 +136,14 @@ class StripeService:
     - Webhook event processing
     - Subscription management
     - Customer portal access
+    
+    Create one instance per worker and reuse it; pass a client from
+    create_supabase_client() to get pooled connections.
     """
     
     def __init__(self, supabase_client: Client):
         self.supabase = supabase_client
-        self.base_url = os.getenv('APP_BASE_URL', 'http://localhost:8501')
+        self.base_url = APP_BASE_URL
     
     def create_checkout_session(
         self,
@@ -145,6 +217,9 @@ class StripeService:
                 
                 # Tax calculation
                 automatic_tax={'enabled': True},
+                
+                # Streamlit reruns replay this call; reuse the same session
+                idempotency_key=f"checkout:{user_id}:{tier}:{interval}:{date.today().isoformat()}",
             )
             
             logger.info(f"Created checkout session for user {user_id}: {session.id}")
@@ -161,21 +236,38 @@ class StripeService:
             logger.error(f"Error creating checkout session: {e}")
             raise
     
+    def _get_customer_id(self, user_id: str) -> Optional[str]:
+        """
+        Get the user's Stripe customer ID from cache, falling back to
+        a primary-key lookup on profiles.
+        """
+        cached = _customer_cache.get(user_id)
+        if cached:
+            return cached
+        
+        profile = self.supabase.table('profiles').select('stripe_customer_id').eq('id', user_id).single().execute()
+        
+        if profile.data and profile.data.get('stripe_customer_id'):
+            _customer_cache[user_id] = profile.data['stripe_customer_id']
+            return profile.data['stripe_customer_id']
+        
+        return None
+    
     def _get_or_create_customer(self, user_id: str, email: str) -> str:
         """
         Get existing Stripe customer ID or create new customer.
         """
         try:
             # Check if user already has Stripe customer
-            profile = self.supabase.table('profiles').select('stripe_customer_id').eq('id', user_id).single().execute()
-            
-            if profile.data and profile.data.get('stripe_customer_id'):
-                return profile.data['stripe_customer_id']
+            customer_id = self._get_customer_id(user_id)
+            if customer_id:
+                return customer_id
             
             # Create new Stripe customer
             customer = stripe.Customer.create(
                 email=email,
-                metadata={'user_id': user_id}
+                metadata={'user_id': user_id},
+                idempotency_key=f"customer:{user_id}"
             )
             
             # Store customer ID in database
@@ -183,6 +275,8 @@ class StripeService:
                 'stripe_customer_id': customer.id
             }).eq('id', user_id).execute()
             
+            _customer_cache[user_id] = customer.id
+            
             logger.info(f"Created Stripe customer for user {user_id}: {customer.id}")
             
             return customer.id
@@ -200,13 +294,11 @@ class StripeService:
         """
         try:
             # Get customer ID
-            profile = self.supabase.table('profiles').select('stripe_customer_id').eq('id', user_id).single().execute()
+            customer_id = self._get_customer_id(user_id)
             
-            if not profile.data or not profile.data.get('stripe_customer_id'):
+            if not customer_id:
                 raise ValueError("User does not have a Stripe customer")
             
-            customer_id = profile.data['stripe_customer_id']
-            
             # Create portal session
             session = stripe.billing_portal.Session.create(
                 customer=customer_id,
@@ -236,10 +328,10 @@ class StripeService:
             Parsed Stripe event or None if verification fails
         """
         try:
-            event = stripe.Webhook.construct_event(
+            event = construct_webhook_event(
                 payload,
                 signature,
-                STRIPE_WEBHOOK_SECRET
+                STRIPE_WEBHOOK_KEY
             )
             return event
         except ValueError as e:
@@ -262,48 +354,42 @@ class StripeService:
         event_id = event['id']
         event_type = event['type']
         
+        # Catch redeliveries in Redis before touching Postgres
+        if not self._claim_event_fast(event_id):
+            logger.info(f"Event {event_id} is a duplicate delivery, skipping")
+            return True, "Duplicate event"
+        
         try:
-            # Check if event already processed (idempotency)
-            existing = self.supabase.table('stripe_events').select('*').eq('id', event_id).execute()
+            # Claim event for processing (idempotency) - returns no row
+            # if this event was already processed
+            claimed = self.supabase.rpc('claim_stripe_event', {
+                'p_event_id': event_id,
+                'p_type': event_type,
+                'p_data': event
+            }).execute()
             
-            if existing.data and existing.data[0].get('processed'):
+            if not claimed.data:
                 logger.info(f"Event {event_id} already processed, skipping")
                 return True, "Event already processed"
             
-            # Store event for idempotency tracking
-            self.supabase.table('stripe_events').upsert({
-                'id': event_id,
-                'type': event_type,
-                'data': event,
-                'processed': False,
-                'created_at': datetime.utcnow().isoformat()
-            }).execute()
-            
             # Route to appropriate handler
-            handler_map = {
-                'checkout.session.completed': self._handle_checkout_completed,
-                'customer.subscription.updated': self._handle_subscription_updated,
-                'customer.subscription.deleted': self._handle_subscription_deleted,
-                'invoice.paid': self._handle_invoice_paid,
-                'invoice.payment_failed': self._handle_payment_failed,
-            }
-            
-            handler = handler_map.get(event_type)
+            handler_name = _HANDLER_NAMES.get(event_type)
             
-            if handler:
-                success, message = handler(event['data']['object'])
+            if handler_name:
+                success, message = getattr(self, handler_name)(event['data']['object'])
                 
                 if success:
                     # Mark event as processed
                     self.supabase.table('stripe_events').update({
                         'processed': True,
-                        'processed_at': datetime.utcnow().isoformat()
-                    }).eq('id', event_id).execute()
+                        'processed_at': datetime.now(timezone.utc).isoformat()
+                    }, returning=ReturnMethod.minimal).eq('id', event_id).eq('processed', False).execute()
                     
                     logger.info(f"Successfully processed event {event_id}: {event_type}")
                     return True, message
                 else:
                     logger.error(f"Failed to process event {event_id}: {message}")
+                    self._release_event_fast(event_id)
                     return False, message
             else:
                 logger.info(f"Unhandled event type: {event_type}")
@@ -311,15 +397,40 @@ class StripeService:
                 
         except Exception as e:
             logger.error(f"Error processing webhook event {event_id}: {e}")
+            self._release_event_fast(event_id)
             
             # Increment retry count
-            self.supabase.table('stripe_events').update({
-                'retry_count': self.supabase.rpc('increment', {'x': 1}),
-                'error_message': str(e)
-            }).eq('id', event_id).execute()
+            self.supabase.rpc('record_stripe_event_failure', {
+                'p_event_id': event_id,
+                'p_error_message': str(e)
+            }).execute()
             
             return False, str(e)
     
+    def _claim_event_fast(self, event_id: str) -> bool:
+        """
+        Atomically mark event as seen in Redis (SET NX EX).
+        Returns False for duplicates; True when new or Redis is unavailable.
+        """
+        if _redis is None:
+            return True
+        
+        try:
+            return bool(_redis.set(f"stripe:evt:{event_id}", "1", nx=True, ex=EVENT_DEDUPE_TTL))
+        except redis.RedisError as e:
+            logger.warning(f"Redis unavailable for event de-duplication: {e}")
+            return True
+    
+    def _release_event_fast(self, event_id: str):
+        """Forget a failed event in Redis so Stripe's retry is processed."""
+        if _redis is None:
+            return
+        
+        try:
+            _redis.delete(f"stripe:evt:{event_id}")
+        except redis.RedisError as e:
+            logger.warning(f"Redis unavailable to release event {event_id}: {e}")
+    
     def _handle_checkout_completed(self, session: Dict) -> Tuple[bool, str]:
         """
         Handle successful checkout completion.
@@ -330,62 +441,39 @@ class StripeService:
             tier = session['metadata']['tier']
             interval = session['metadata']['interval']
             
-            subscription_id = session['subscription']
             customer_id = session['customer']
             
-            # Retrieve full subscription details from Stripe
-            subscription = stripe.Subscription.retrieve(subscription_id)
+            # Use the subscription expanded in the event payload when present,
+            # otherwise retrieve full subscription details from Stripe
+            if isinstance(session['subscription'], dict):
+                subscription = session['subscription']
+            else:
+                subscription = stripe.Subscription.retrieve(session['subscription'])
+            subscription_id = subscription['id']
             
             # Get pricing config
             pricing = PRICING_CONFIG[tier][interval]
             
-            # Create subscription record
-            self.supabase.table('subscriptions').insert({
-                'user_id': user_id,
-                'stripe_subscription_id': subscription_id,
-                'stripe_customer_id': customer_id,
-                'stripe_price_id': subscription['items']['data'][0]['price']['id'],
-                'status': subscription['status'],
-                'tier': tier,
-                'currency': subscription['currency'],
-                'amount': pricing['amount'],
-                'interval': interval,
-                'current_period_start': datetime.fromtimestamp(subscription['current_period_start']).isoformat(),
-                'current_period_end': datetime.fromtimestamp(subscription['current_period_end']).isoformat(),
-                'trial_start': datetime.fromtimestamp(subscription['trial_start']).isoformat() if subscription.get('trial_start') else None,
-                'trial_end': datetime.fromtimestamp(subscription['trial_end']).isoformat() if subscription.get('trial_end') else None,
+            # Create subscription record, update profile, grant initial
+            # credits and write the audit log in one transaction
+            self.supabase.rpc('complete_checkout', {
+                'p_user_id': user_id,
+                'p_tier': tier,
+                'p_interval': interval,
+                'p_sub': {
+                    'stripe_subscription_id': subscription_id,
+                    'stripe_customer_id': customer_id,
+                    'stripe_price_id': subscription['items']['data'][0]['price']['id'],
+                    'status': subscription['status'],
+                    'currency': subscription['currency'],
+                    'current_period_start': _ts(subscription['current_period_start']),
+                    'current_period_end': _ts(subscription['current_period_end']),
+                    'trial_start': _ts(subscription.get('trial_start')),
+                    'trial_end': _ts(subscription.get('trial_end')),
+                },
+                'p_pricing': dict(pricing)
             }).execute()
             
-            # Update user profile
-            self.supabase.table('profiles').update({
-                'tier': tier,
-                'stripe_subscription_id': subscription_id,
-                'monthly_scan_limit': pricing['scan_limit'],
-                'tier_updated_at': datetime.utcnow().isoformat()
-            }).eq('id', user_id).execute()
-            
-            # Grant initial credits
-            self._grant_credits(
-                user_id=user_id,
-                amount=pricing['credits'],
-                reference_id=subscription_id,
-                reference_type='subscription',
-                description=f"Initial credits for {tier.title()} {interval}ly subscription"
-            )
-            
-            # Create audit log
-            self._create_audit_log(
-                user_id=user_id,
-                action='subscription_created',
-                resource_type='subscription',
-                resource_id=subscription_id,
-                metadata={
-                    'tier': tier,
-                    'interval': interval,
-                    'amount': pricing['amount']
-                }
-            )
-            
             return True, "Checkout completed successfully"
             
         except Exception as e:
@@ -403,10 +491,10 @@ class StripeService:
             # Update subscription record
             self.supabase.table('subscriptions').update({
                 'status': subscription['status'],
-                'current_period_start': datetime.fromtimestamp(subscription['current_period_start']).isoformat(),
-                'current_period_end': datetime.fromtimestamp(subscription['current_period_end']).isoformat(),
+                'current_period_start': _ts(subscription['current_period_start']),
+                'current_period_end': _ts(subscription['current_period_end']),
                 'cancel_at_period_end': subscription['cancel_at_period_end'],
-                'canceled_at': datetime.fromtimestamp(subscription['canceled_at']).isoformat() if subscription.get('canceled_at') else None,
+                'canceled_at': _ts(subscription.get('canceled_at')),
             }).eq('stripe_subscription_id', subscription_id).execute()
             
             return True, "Subscription updated successfully"
@@ -424,26 +512,14 @@ class StripeService:
             user_id = subscription['metadata']['user_id']
             subscription_id = subscription['id']
             
-            # Update subscription status
-            self.supabase.table('subscriptions').update({
-                'status': 'canceled',
-                'ended_at': datetime.utcnow().isoformat()
-            }).eq('stripe_subscription_id', subscription_id).execute()
+            # Cancel subscription, downgrade user to demo tier and write
+            # the audit log in one transaction
+            self.supabase.rpc('cancel_subscription', {
+                'p_user_id': user_id,
+                'p_subscription_id': subscription_id
+            }).execute()
             
-            # Downgrade user to demo tier
-            self.supabase.table('profiles').update({
-                'tier': 'demo',
-                'monthly_scan_limit': 2,
-                'tier_updated_at': datetime.utcnow().isoformat()
-            }).eq('id', user_id).execute()
-            
-            # Create audit log
-            self._create_audit_log(
-                user_id=user_id,
-                action='subscription_canceled',
-                resource_type='subscription',
-                resource_id=subscription_id
-            )
+            _customer_cache.pop(user_id, None)
             
             return True, "Subscription canceled successfully"
             
@@ -462,31 +538,40 @@ class StripeService:
             if not subscription_id:
                 return True, "No subscription associated with invoice"
             
-            # Get subscription details
-            sub_record = self.supabase.table('subscriptions').select('*').eq('stripe_subscription_id', subscription_id).single().execute()
-            
-            if not sub_record.data:
-                return False, "Subscription record not found"
-            
-            user_id = sub_record.data['user_id']
-            tier = sub_record.data['tier']
-            interval = sub_record.data['interval']
+            # Derive pricing from the invoice line and the user from the
+            # subscription metadata set at checkout
+            line = invoice['lines']['data'][0]
+            price_id = (line.get('price') or {}).get('id')
+            user_id = (
+                (invoice.get('subscription_details') or {}).get('metadata', {}).get('user_id')
+                or line.get('metadata', {}).get('user_id')
+            )
             
-            # Grant renewal credits
-            pricing = PRICING_CONFIG[tier][interval]
-            self._grant_credits(
+            if price_id in PRICE_ID_INDEX and user_id:
+                tier, interval, pricing = PRICE_ID_INDEX[price_id]
+            else:
+                # Fall back to the stored subscription record
+                sub_record = self.supabase.table('subscriptions').select('user_id, tier, interval').eq('stripe_subscription_id', subscription_id).single().execute()
+                
+                if not sub_record.data:
+                    return False, "Subscription record not found"
+                
+                user_id = sub_record.data['user_id']
+                tier = sub_record.data['tier']
+                interval = sub_record.data['interval']
+                pricing = PRICING_CONFIG[tier][interval]
+            
+            # Grant renewal credits and reset monthly scan counter concurrently
+            grant = _io_executor.submit(
+                self._grant_credits,
                 user_id=user_id,
                 amount=pricing['credits'],
-                reference_id=subscription_id,
-                reference_type='subscription',
+                subscription_id=subscription_id,
                 description=f"Monthly renewal credits for {tier.title()} subscription"
             )
-            
-            # Reset monthly scan counter
-            self.supabase.table('profiles').update({
-                'monthly_scans_used': 0,
-                'scan_limit_reset_date': datetime.utcnow() + timedelta(days=30)
-            }).eq('id', user_id).execute()
+            reset = _io_executor.submit(self._reset_scan_counter, user_id)
+            grant.result()
+            reset.result()
             
             return True, "Invoice paid and credits granted"
             
@@ -523,61 +608,30 @@ class StripeService:
         self,
         user_id: str,
         amount: int,
-        reference_id: str,
-        reference_type: str,
+        subscription_id: str,
         description: str
     ):
         """
         Grant credits to user and create transaction record.
         """
         try:
-            # Get current balance
-            profile = self.supabase.table('profiles').select('credits_balance').eq('id', user_id).single().execute()
-            current_balance = profile.data['credits_balance']
-            new_balance = current_balance + amount
-            
-            # Update profile
-            self.supabase.table('profiles').update({
-                'credits_balance': new_balance,
-                'total_credits_purchased': self.supabase.rpc('increment', {'x': amount})
-            }).eq('id', user_id).execute()
-            
-            # Create transaction record
-            self.supabase.table('credit_transactions').insert({
-                'user_id': user_id,
-                'type': 'subscription_credit',
-                'amount': amount,
-                'balance_after': new_balance,
-                'reference_id': reference_id,
-                'reference_type': reference_type,
-                'description': description
+            # Add credits and write the credit transaction in one transaction;
+            # the Stripe subscription ID goes in metadata (reference_id is a UUID)
+            result = self.supabase.rpc('grant_credits_atomic', {
+                'p_user_id': user_id,
+                'p_amount': amount,
+                'p_subscription_id': subscription_id,
+                'p_description': description
             }).execute()
             
-            logger.info(f"Granted {amount} credits to user {user_id}")
+            logger.info(f"Granted {amount} credits to user {user_id}. New balance: {result.data}")
             
         except Exception as e:
             logger.error(f"Error granting credits: {e}")
             raise
     
-    def _create_audit_log(
-        self,
-        user_id: str,
-        action: str,
-        resource_type: str,
-        resource_id: Optional[str] = None,
-        metadata: Optional[Dict] = None
-    ):
+    def _reset_scan_counter(self, user_id: str):
         """
-        Create audit log entry for important actions.
+        Reset monthly scan usage for a new billing period.
         """
-        try:
-            self.supabase.table('audit_logs').insert({
-                'user_id': user_id,
-                'action': action,
-                'resource_type': resource_type,
-                'resource_id': resource_id,
-                'metadata': metadata or {}
-            }).execute()
-        except Exception as e:
-            logger.error(f"Error creating audit log: {e}")
-            # Don't raise - audit log failure shouldn't block operations
+        self.supabase.rpc('reset_scan_counter', {'p_user_id': user_id}).execute()
@@ -1,51 +1,33 @@
 # stripe_webhook.py
-import stripe
-from supabase import create_client
+#
+# Run with gunicorn + gevent so concurrent webhook deliveries are handled in parallel:
+#     gunicorn stripe_webhook:app -k gevent -w 4 --worker-connections 200 --timeout 30
 import os
 from flask import Flask, request, jsonify
+from stripe_local import StripeService, create_supabase_client
 
 app = Flask(__name__)
 
-# Supabase client
+# Supabase client (service role - webhook writes bypass RLS)
 supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_KEY")
-supabase = create_client(supabase_url, supabase_key)
+supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
+supabase = create_supabase_client(supabase_url, supabase_key)
 
-# Stripe webhook secret from stripe listen
-endpoint_secret = "whsec_34edfdf1441d0af35228e2a64eb95d5cf28a369a9303615aa93d9e8ce30adead"
-
-def mark_paid(user_email, plan_name):
-    supabase.table("profiles").update({
-        "paid": True,
-        "plan": plan_name
-    }).eq("email", user_email).execute()
+# One service per worker; signing secret is read from STRIPE_WEBHOOK_SECRET
+stripe_service = StripeService(supabase)
 
 @app.route("/stripe_webhook", methods=["POST"])
 def stripe_webhook():
     payload = request.data
     sig_header = request.headers.get("Stripe-Signature")
 
-    try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, endpoint_secret
-        )
-    except ValueError as e:
-        # Invalid payload
-        return jsonify({"error": str(e)}), 400
-    except stripe.error.SignatureVerificationError as e:
-        # Invalid signature
-        return jsonify({"error": str(e)}), 400
-
-    # Handle the checkout session completion
-    if event["type"] == "checkout.session.completed":
-        session = event["data"]["object"]
-        customer_email = session.get("customer_email")
-        plan_name = session.get("metadata", {}).get("plan_name", "Pro Mensual")
-        
-        if customer_email:
-            mark_paid(customer_email, plan_name)
+    event = stripe_service.verify_webhook_signature(payload, sig_header)
+    if event is None:
+        return jsonify({"error": "Invalid webhook"}), 400
 
-    return jsonify({"status": "success"}), 200
+    success, message = stripe_service.process_webhook_event(event)
+    if not success:
+        # Non-2xx makes Stripe retry the delivery
+        return jsonify({"status": "error", "message": message}), 500
 
-if __name__ == "__main__":
-    app.run(port=8501)
+    return jsonify({"status": "success", "message": message}), 200
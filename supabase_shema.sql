@@ -17,7 +17,9 @@ CREATE TABLE IF NOT EXISTS users (
 -- Create index on username and email for faster lookups
 CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
-CREATE INDEX IF NOT EXISTS idx_users_stripe_customer ON users(stripe_customer_id);
+-- One user per Stripe customer; webhooks look users up by stripe_customer_id
+DROP INDEX IF EXISTS idx_users_stripe_customer;
+CREATE UNIQUE INDEX IF NOT EXISTS users_stripe_customer_id_uidx ON users(stripe_customer_id) WHERE stripe_customer_id IS NOT NULL;
 
 -- Subscriptions Table
 CREATE TABLE IF NOT EXISTS subscriptions (
@@ -37,7 +39,8 @@ CREATE TABLE IF NOT EXISTS subscriptions (
 
 -- Create indexes for subscriptions
 CREATE INDEX IF NOT EXISTS idx_subscriptions_user_id ON subscriptions(user_id);
-CREATE INDEX IF NOT EXISTS idx_subscriptions_stripe_id ON subscriptions(stripe_subscription_id);
+-- stripe_subscription_id is UNIQUE, so its constraint index already serves lookups
+DROP INDEX IF EXISTS idx_subscriptions_stripe_id;
 CREATE INDEX IF NOT EXISTS idx_subscriptions_status ON subscriptions(status);
 
 -- Scans Table
@@ -68,6 +71,25 @@ CREATE TABLE IF NOT EXISTS webhook_events (
 CREATE INDEX IF NOT EXISTS idx_webhook_events_type ON webhook_events(event_type);
 CREATE INDEX IF NOT EXISTS idx_webhook_events_processed ON webhook_events(processed);
 
+-- Record a webhook event from its raw JSON body (parsed to jsonb server-side).
+-- Returns false if the event was already recorded and processed.
+CREATE OR REPLACE FUNCTION insert_webhook_event(p_event_id TEXT, p_event_type TEXT, p_payload TEXT)
+RETURNS BOOLEAN AS $$
+    WITH inserted AS (
+        INSERT INTO webhook_events (event_id, event_type, payload)
+        VALUES (p_event_id, p_event_type, p_payload::jsonb)
+        ON CONFLICT (event_id) DO NOTHING
+        RETURNING true
+    )
+    SELECT COALESCE(
+        (SELECT true FROM inserted),
+        NOT (SELECT COALESCE(processed, false) FROM webhook_events WHERE event_id = p_event_id)
+    );
+$$ LANGUAGE sql;
+
+REVOKE EXECUTE ON FUNCTION insert_webhook_event(TEXT, TEXT, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION insert_webhook_event(TEXT, TEXT, TEXT) TO service_role;
+
 -- Function to update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -4,12 +4,180 @@ Sends SEO reports via email
 """
 
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
+import atexit
+import base64
+import bisect
+import functools
+import logging
+import re
+import threading
+import email.policy
+from email.message import EmailMessage
+from dataclasses import dataclass
 from datetime import datetime
+import asyncio
 import os
 
+try:
+    import aiosmtplib
+except ImportError:
+    aiosmtplib = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+# Recycle the SMTP connection after this many messages
+MAX_MESSAGES_PER_CONNECTION = 100
+
+
+# Report email HTML, compiled once; placeholders are filled by str.format_map
+_EMAIL_TEMPLATE = """\
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+</head>
+<body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
+    
+    <!-- Header -->
+    <div style="background: linear-gradient(135deg, #6366f1, #8b5cf6); padding: 30px; text-align: center; border-radius: 10px 10px 0 0;">
+        <h1 style="color: white; margin: 0; font-size: 28px;">🎯 Nexus SEO Intelligence</h1>
+        <p style="color: #e0e7ff; margin: 10px 0 0 0;">Your SEO Audit is Ready</p>
+    </div>
+    
+    <!-- Content -->
+    <div style="background: #ffffff; padding: 30px; border: 1px solid #e5e7eb; border-top: none; border-radius: 0 0 10px 10px;">
+        
+        <p style="font-size: 16px; margin-bottom: 20px;">
+            Hello {recipient_name},
+        </p>
+        
+        <p style="font-size: 16px; margin-bottom: 25px;">
+            We've completed the comprehensive SEO audit for <strong>{scan_url}</strong>. 
+            Your detailed report is attached to this email.
+        </p>
+        
+        <!-- Score Box -->
+        <div style="background: #f8fafc; border: 2px solid {score_color}; border-radius: 10px; padding: 25px; text-align: center; margin: 30px 0;">
+            <h2 style="color: #1e293b; margin: 0 0 15px 0; font-size: 18px;">Overall SEO Score</h2>
+            <div style="font-size: 48px; font-weight: bold; color: {score_color}; margin: 15px 0;">
+                {scan_score}/100
+            </div>
+            <p style="color: #64748b; margin: 10px 0 0 0; font-size: 16px;">
+                Status: <strong style="color: {score_color};">{status}</strong>
+            </p>
+        </div>
+        
+        <!-- Report Includes -->
+        <div style="margin: 30px 0;">
+            <h3 style="color: #1e293b; font-size: 18px; margin-bottom: 15px;">📋 Your Report Includes:</h3>
+            <ul style="color: #475569; font-size: 15px; line-height: 2;">
+                <li>✅ Comprehensive SEO score breakdown</li>
+                <li>✅ Technical, content, and performance analysis</li>
+                <li>✅ Prioritized list of issues to fix</li>
+                <li>✅ AI-powered recommendations</li>
+                <li>✅ Actionable next steps</li>
+            </ul>
+        </div>
+        
+        <!-- CTA Button -->
+        <div style="text-align: center; margin: 35px 0;">
+            <a href="https://nexus-seo-fobcg4apinvom9hzpjnfyb.streamlit.app" 
+               style="display: inline-block; background: linear-gradient(135deg, #6366f1, #8b5cf6); color: white; 
+                      padding: 15px 40px; text-decoration: none; border-radius: 8px; font-weight: bold; font-size: 16px;">
+                View Full Dashboard
+            </a>
+        </div>
+        
+        <!-- Next Steps -->
+        <div style="background: #eff6ff; border-left: 4px solid #3b82f6; padding: 20px; margin: 30px 0; border-radius: 5px;">
+            <h4 style="color: #1e40af; margin: 0 0 10px 0;">💡 Next Steps:</h4>
+            <p style="color: #1e40af; margin: 5px 0; font-size: 14px;">
+                1. Review the attached PDF report<br>
+                2. Prioritize high-impact issues<br>
+                3. Implement recommended fixes<br>
+                4. Run a follow-up scan to track progress
+            </p>
+        </div>
+        
+        <!-- Support -->
+        <div style="margin-top: 35px; padding-top: 25px; border-top: 2px solid #e5e7eb;">
+            <p style="font-size: 14px; color: #64748b; margin: 10px 0;">
+                Questions or need help implementing these recommendations?
+            </p>
+            <p style="font-size: 14px; color: #64748b; margin: 5px 0;">
+                Reply to this email or visit our 
+                <a href="https://nexus-seo-fobcg4apinvom9hzpjnfyb.streamlit.app" style="color: #6366f1; text-decoration: none;">
+                    support center
+                </a>
+            </p>
+        </div>
+        
+    </div>
+    
+    <!-- Footer -->
+    <div style="text-align: center; padding: 25px 0; color: #94a3b8; font-size: 13px;">
+        <p style="margin: 5px 0;">
+            This report was generated on {generated_at}
+        </p>
+        <p style="margin: 5px 0;">
+            © 2026 Nexus SEO Intelligence. All rights reserved.
+        </p>
+        <p style="margin: 15px 0 5px 0;">
+            <a href="#" style="color: #94a3b8; text-decoration: none; margin: 0 10px;">Privacy Policy</a>
+            <a href="#" style="color: #94a3b8; text-decoration: none; margin: 0 10px;">Terms of Service</a>
+        </p>
+    </div>
+    
+</body>
+</html>
+"""
+
+# (min score, color, status), ascending by threshold for bisect lookup
+_SCORE_BUCKETS = [
+    (0, '#ef4444', 'Critical'),
+    (40, '#f97316', 'Needs Improvement'),
+    (60, '#eab308', 'Good'),
+    (80, '#22c55e', 'Excellent'),
+]
+_THRESHOLDS = [bucket[0] for bucket in _SCORE_BUCKETS]
+
+
+@functools.lru_cache(maxsize=256)
+def _render_email_body(recipient_name, scan_url, scan_score, generated_at):
+    """Render the report email; every dynamic field is part of the cache key"""
+    score = max(0, min(100, int(scan_score)))
+    _, score_color, status = _SCORE_BUCKETS[bisect.bisect_right(_THRESHOLDS, score) - 1]
+    
+    return _EMAIL_TEMPLATE.format_map({
+        'recipient_name': recipient_name,
+        'scan_url': scan_url,
+        'scan_score': scan_score,
+        'score_color': score_color,
+        'status': status,
+        'generated_at': generated_at,
+    })
+
+
+_URL_STRIP = re.compile(r'^https?://')
+
+
+@functools.lru_cache(maxsize=1024)
+def _filename_from_url(url):
+    """PDF attachment filename for a scanned URL"""
+    return ('SEO_Report_' + _URL_STRIP.sub('', url).replace('/', '_'))[:60] + '.pdf'
+
+
+def _create_email_body(recipient_name, scan_url, scan_score):
+    """Render the report email for the current time"""
+    generated_at = datetime.now().strftime('%B %d, %Y at %I:%M %p')
+    return _render_email_body(recipient_name, scan_url, scan_score, generated_at)
+
 
 class EmailService:
     """Handle email sending for reports"""
@@ -29,8 +197,62 @@ class EmailService:
         self.smtp_user = smtp_user or os.getenv('SMTP_USER')
         self.smtp_password = smtp_password or os.getenv('SMTP_PASSWORD')
         
-        if not self.smtp_user or not self.smtp_password:
+        # EMAIL_BACKEND=http sends through the email HTTP API instead of SMTP
+        self._http_backend = None
+        if os.getenv('EMAIL_BACKEND', 'smtp').lower() == 'http':
+            self._http_backend = HTTPEmailBackend(sender=self.smtp_user)
+        elif not self.smtp_user or not self.smtp_password:
             raise ValueError("SMTP credentials not configured. Set SMTP_USER and SMTP_PASSWORD environment variables.")
+        
+        # Long-lived authenticated connection, opened lazily and reused across
+        # sends; the lock keeps concurrent sessions from interleaving SMTP commands
+        self._smtp = None
+        self._msgs_sent = 0
+        self._smtp_lock = threading.RLock()
+    
+    def _connect(self):
+        """Open, secure and authenticate a new SMTP connection"""
+        server = smtplib.SMTP(self.smtp_host, self.smtp_port)
+        server.starttls()
+        server.login(self.smtp_user, self.smtp_password)
+        self._smtp = server
+        self._msgs_sent = 0
+        return server
+    
+    def _get_server(self):
+        """
+        Return a live SMTP connection, reconnecting if the server dropped it
+        or the per-connection message cap has been reached
+        """
+        if self._smtp is None:
+            return self._connect()
+        
+        if self._msgs_sent >= MAX_MESSAGES_PER_CONNECTION:
+            self.close()
+            return self._connect()
+        
+        try:
+            code, _ = self._smtp.noop()
+            if code == 250:
+                return self._smtp
+        except (smtplib.SMTPException, OSError):
+            pass
+        
+        self.close()
+        return self._connect()
+    
+    def close(self):
+        """Close the pooled SMTP connection"""
+        with self._smtp_lock:
+            if self._smtp is None:
+                return
+            
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            finally:
+                self._smtp = None
     
     def send_report(self, recipient_email, recipient_name, scan_url, pdf_buffer, scan_score):
         """
@@ -46,160 +268,287 @@ class EmailService:
         Returns:
             bool: True if sent successfully
         """
+        if self._http_backend is not None:
+            job = ReportJob(recipient_email, recipient_name, scan_url, pdf_buffer, scan_score)
+            return asyncio.run(self._send_http(job))
+        
         try:
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = f"Nexus SEO Intelligence <{self.smtp_user}>"
-            msg['To'] = recipient_email
-            msg['Subject'] = f"SEO Audit Report for {scan_url}"
+            msg = self._build_message(recipient_email, recipient_name, scan_url, pdf_buffer, scan_score)
             
-            # Email body
-            html_body = self._create_email_body(recipient_name, scan_url, scan_score)
-            msg.attach(MIMEText(html_body, 'html'))
-            
-            # Attach PDF
-            pdf_buffer.seek(0)
-            pdf_attachment = MIMEApplication(pdf_buffer.read(), _subtype='pdf')
-            pdf_attachment.add_header(
-                'Content-Disposition',
-                'attachment',
-                filename=f'SEO_Report_{scan_url.replace("https://", "").replace("http://", "").replace("/", "_")[:50]}.pdf'
-            )
-            msg.attach(pdf_attachment)
-            
-            # Send email
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
+            # Send email over the pooled connection, one sender at a time
+            with self._smtp_lock:
+                try:
+                    server = self._get_server()
+                    server.send_message(msg)
+                    self._msgs_sent += 1
+                except Exception:
+                    # Drop the connection; the next send reconnects
+                    self.close()
+                    raise
             
             return True
             
-        except Exception as e:
-            print(f"Error sending email: {str(e)}")
+        except Exception:
+            logger.exception("Error sending email to %s", recipient_email)
             return False
     
+    def _build_message(self, recipient_email, recipient_name, scan_url, pdf_buffer, scan_score):
+        """Build the report message with HTML body and PDF attachment"""
+        # Create message
+        msg = EmailMessage(policy=email.policy.SMTP)
+        msg['From'] = f"Nexus SEO Intelligence <{self.smtp_user}>"
+        msg['To'] = recipient_email
+        msg['Subject'] = f"SEO Audit Report for {scan_url}"
+        
+        # Email body
+        html_body = self._create_email_body(recipient_name, scan_url, scan_score)
+        msg.set_content(html_body, subtype='html')
+        
+        # Attach PDF (getvalue() shares the BytesIO buffer, no extra read copy)
+        msg.add_attachment(
+            pdf_buffer.getvalue(),
+            maintype='application',
+            subtype='pdf',
+            filename=_filename_from_url(scan_url)
+        )
+        
+        return msg
+    
+    async def _send_http(self, job):
+        """Single send over the HTTP backend; the client is bound to this event loop"""
+        try:
+            return await self._http_backend.send_one(job)
+        finally:
+            await self._http_backend.aclose()
+    
     def _create_email_body(self, recipient_name, scan_url, scan_score):
         """Create HTML email body"""
+        return _create_email_body(recipient_name, scan_url, scan_score)
+
+
+@dataclass
+class ReportJob:
+    """A report email queued for bulk delivery"""
+    recipient_email: str
+    recipient_name: str
+    scan_url: str
+    pdf_buffer: object
+    scan_score: int
+
+
+class AsyncEmailService(EmailService):
+    """
+    Bulk report delivery over native asyncio SMTP (aiosmtplib)
+    
+    SMTP handles one message at a time per connection, so send_many()
+    sends sequentially over one shared connection while the event loop
+    overlaps network waits with other work. send_sharded() splits jobs over
+    a bounded number of concurrent connections to the same relay; those stay
+    open for later calls until aclose().
+    """
+    
+    def __init__(self, smtp_host=None, smtp_port=None, smtp_user=None, smtp_password=None):
+        if aiosmtplib is None:
+            raise ImportError("aiosmtplib is required for AsyncEmailService. Install with: pip install aiosmtplib")
         
-        # Score color
-        if scan_score >= 80:
-            score_color = '#22c55e'
-            status = 'Excellent'
-        elif scan_score >= 60:
-            score_color = '#eab308'
-            status = 'Good'
-        elif scan_score >= 40:
-            score_color = '#f97316'
-            status = 'Needs Improvement'
-        else:
-            score_color = '#ef4444'
-            status = 'Critical'
-        
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        </head>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
-            
-            <!-- Header -->
-            <div style="background: linear-gradient(135deg, #6366f1, #8b5cf6); padding: 30px; text-align: center; border-radius: 10px 10px 0 0;">
-                <h1 style="color: white; margin: 0; font-size: 28px;">🎯 Nexus SEO Intelligence</h1>
-                <p style="color: #e0e7ff; margin: 10px 0 0 0;">Your SEO Audit is Ready</p>
-            </div>
-            
-            <!-- Content -->
-            <div style="background: #ffffff; padding: 30px; border: 1px solid #e5e7eb; border-top: none; border-radius: 0 0 10px 10px;">
-                
-                <p style="font-size: 16px; margin-bottom: 20px;">
-                    Hello {recipient_name},
-                </p>
-                
-                <p style="font-size: 16px; margin-bottom: 25px;">
-                    We've completed the comprehensive SEO audit for <strong>{scan_url}</strong>. 
-                    Your detailed report is attached to this email.
-                </p>
-                
-                <!-- Score Box -->
-                <div style="background: #f8fafc; border: 2px solid {score_color}; border-radius: 10px; padding: 25px; text-align: center; margin: 30px 0;">
-                    <h2 style="color: #1e293b; margin: 0 0 15px 0; font-size: 18px;">Overall SEO Score</h2>
-                    <div style="font-size: 48px; font-weight: bold; color: {score_color}; margin: 15px 0;">
-                        {scan_score}/100
-                    </div>
-                    <p style="color: #64748b; margin: 10px 0 0 0; font-size: 16px;">
-                        Status: <strong style="color: {score_color};">{status}</strong>
-                    </p>
-                </div>
-                
-                <!-- Report Includes -->
-                <div style="margin: 30px 0;">
-                    <h3 style="color: #1e293b; font-size: 18px; margin-bottom: 15px;">📋 Your Report Includes:</h3>
-                    <ul style="color: #475569; font-size: 15px; line-height: 2;">
-                        <li>✅ Comprehensive SEO score breakdown</li>
-                        <li>✅ Technical, content, and performance analysis</li>
-                        <li>✅ Prioritized list of issues to fix</li>
-                        <li>✅ AI-powered recommendations</li>
-                        <li>✅ Actionable next steps</li>
-                    </ul>
-                </div>
-                
-                <!-- CTA Button -->
-                <div style="text-align: center; margin: 35px 0;">
-                    <a href="https://nexus-seo-fobcg4apinvom9hzpjnfyb.streamlit.app" 
-                       style="display: inline-block; background: linear-gradient(135deg, #6366f1, #8b5cf6); color: white; 
-                              padding: 15px 40px; text-decoration: none; border-radius: 8px; font-weight: bold; font-size: 16px;">
-                        View Full Dashboard
-                    </a>
-                </div>
-                
-                <!-- Next Steps -->
-                <div style="background: #eff6ff; border-left: 4px solid #3b82f6; padding: 20px; margin: 30px 0; border-radius: 5px;">
-                    <h4 style="color: #1e40af; margin: 0 0 10px 0;">💡 Next Steps:</h4>
-                    <p style="color: #1e40af; margin: 5px 0; font-size: 14px;">
-                        1. Review the attached PDF report<br>
-                        2. Prioritize high-impact issues<br>
-                        3. Implement recommended fixes<br>
-                        4. Run a follow-up scan to track progress
-                    </p>
-                </div>
-                
-                <!-- Support -->
-                <div style="margin-top: 35px; padding-top: 25px; border-top: 2px solid #e5e7eb;">
-                    <p style="font-size: 14px; color: #64748b; margin: 10px 0;">
-                        Questions or need help implementing these recommendations?
-                    </p>
-                    <p style="font-size: 14px; color: #64748b; margin: 5px 0;">
-                        Reply to this email or visit our 
-                        <a href="https://nexus-seo-fobcg4apinvom9hzpjnfyb.streamlit.app" style="color: #6366f1; text-decoration: none;">
-                            support center
-                        </a>
-                    </p>
-                </div>
-                
-            </div>
+        super().__init__(smtp_host, smtp_port, smtp_user, smtp_password)
+        self._async_smtp = None
+        self._lock = asyncio.Lock()
+        # One AsyncEmailService per connection slot, kept open across
+        # send_sharded() calls and closed by aclose()
+        self._shards = []
+    
+    async def _get_async_server(self):
+        """Return a connected, authenticated aiosmtplib connection"""
+        if self._async_smtp is None or not self._async_smtp.is_connected:
+            server = aiosmtplib.SMTP(hostname=self.smtp_host, port=self.smtp_port, start_tls=True)
+            await server.connect()
+            await server.login(self.smtp_user, self.smtp_password)
+            self._async_smtp = server
+        
+        return self._async_smtp
+    
+    async def send_many(self, jobs):
+        """
+        Send report jobs over one shared connection
+        
+        Args:
+            jobs: List of ReportJob
             
-            <!-- Footer -->
-            <div style="text-align: center; padding: 25px 0; color: #94a3b8; font-size: 13px;">
-                <p style="margin: 5px 0;">
-                    This report was generated on {datetime.now().strftime('%B %d, %Y at %I:%M %p')}
-                </p>
-                <p style="margin: 5px 0;">
-                    © 2026 Nexus SEO Intelligence. All rights reserved.
-                </p>
-                <p style="margin: 15px 0 5px 0;">
-                    <a href="#" style="color: #94a3b8; text-decoration: none; margin: 0 10px;">Privacy Policy</a>
-                    <a href="#" style="color: #94a3b8; text-decoration: none; margin: 0 10px;">Terms of Service</a>
-                </p>
-            </div>
+        Returns:
+            list: Per-job success flags, in job order
+        """
+        results = []
+        
+        async with self._lock:
+            for job in jobs:
+                try:
+                    server = await self._get_async_server()
+                    msg = self._build_message(
+                        job.recipient_email, job.recipient_name, job.scan_url,
+                        job.pdf_buffer, job.scan_score
+                    )
+                    await server.send_message(msg)
+                    results.append(True)
+                except Exception:
+                    logger.exception("Error sending email to %s", job.recipient_email)
+                    # Drop the connection; the next job reconnects
+                    await self._close_connection()
+                    results.append(False)
+        
+        return results
+    
+    async def send_sharded(self, jobs, connections=None):
+        """
+        Send report jobs over several connections to the relay, concurrently
+        
+        Jobs are split round-robin into one shard per connection, so at most
+        `connections` SMTP sessions send at once. The connections stay open
+        for the next call until aclose(). Every shard goes to the
+        same smtp_host; this only helps when the relay accepts parallel
+        sessions from one client (most submission services cap this).
+        
+        Args:
+            jobs: List of ReportJob
+            connections: Number of concurrent connections (default: SMTP_CONNECTIONS or 4)
             
-        </body>
-        </html>
+        Returns:
+            list: Per-job success flags, in job order
+        """
+        connections = max(1, min(len(jobs), connections or int(os.getenv('SMTP_CONNECTIONS', 4))))
+        shard_results = await asyncio.gather(*[
+            self._shard_service(index).send_many(jobs[index::connections])
+            for index in range(connections)
+        ])
+        
+        results = [False] * len(jobs)
+        for index, flags in enumerate(shard_results):
+            results[index::connections] = flags
+        
+        return results
+    
+    def _shard_service(self, index):
+        """Return the service for a connection slot, creating it on first use"""
+        while len(self._shards) <= index:
+            self._shards.append(AsyncEmailService(self.smtp_host, self.smtp_port, self.smtp_user, self.smtp_password))
+        return self._shards[index]
+    
+    async def aclose(self):
+        """Close the async SMTP connection and every send_sharded() connection"""
+        await asyncio.gather(*[shard.aclose() for shard in self._shards])
+        self._shards = []
+        await self._close_connection()
+    
+    async def _close_connection(self):
+        """Close this service's own SMTP connection"""
+        if self._async_smtp is None:
+            return
+        
+        try:
+            await self._async_smtp.quit()
+        except (aiosmtplib.SMTPException, OSError):
+            pass
+        finally:
+            self._async_smtp = None
+
+
+class HTTPEmailBackend:
+    """
+    Bulk report delivery through a transactional email HTTP API (SendGrid v3)
+    
+    Unlike SMTP, one HTTP/2 connection multiplexes many in-flight requests,
+    so send_many() posts every job concurrently.
+    """
+    
+    def __init__(self, api_key=None, base_url=None, sender=None):
+        """
+        Initialize HTTP email backend
+        
+        Environment variables:
+        - EMAIL_API_KEY (API key of the email provider)
+        - EMAIL_API_URL (default: https://api.sendgrid.com/v3)
+        - EMAIL_FROM (sender address, falls back to SMTP_USER)
+        """
+        if httpx is None:
+            raise ImportError("httpx is required for HTTPEmailBackend. Install with: pip install 'httpx[http2]'")
+        
+        self.api_key = api_key or os.getenv('EMAIL_API_KEY')
+        self.base_url = base_url or os.getenv('EMAIL_API_URL', 'https://api.sendgrid.com/v3')
+        self.sender = os.getenv('EMAIL_FROM') or sender or os.getenv('SMTP_USER')
+        
+        if not self.api_key or not self.sender:
+            raise ValueError("Email API not configured. Set EMAIL_API_KEY and EMAIL_FROM environment variables.")
+        
+        self._client = None
+    
+    def _get_client(self):
+        """Return the shared HTTP/2 client, created on first use"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=True,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+                headers={'Authorization': f'Bearer {self.api_key}'},
+                timeout=30
+            )
+        
+        return self._client
+    
+    def _build_payload(self, job):
+        """Build the mail/send request body for a report job"""
+        return {
+            'personalizations': [{'to': [{'email': job.recipient_email, 'name': job.recipient_name}]}],
+            'from': {'email': self.sender, 'name': 'Nexus SEO Intelligence'},
+            'subject': f"SEO Audit Report for {job.scan_url}",
+            'content': [{
+                'type': 'text/html',
+                'value': _create_email_body(job.recipient_name, job.scan_url, job.scan_score)
+            }],
+            'attachments': [{
+                'content': base64.b64encode(job.pdf_buffer.getvalue()).decode('ascii'),
+                'type': 'application/pdf',
+                'filename': _filename_from_url(job.scan_url),
+                'disposition': 'attachment'
+            }]
+        }
+    
+    async def send_one(self, job):
         """
+        Send one report job
         
-        return html
+        Returns:
+            bool: True if the API accepted the message
+        """
+        try:
+            response = await self._get_client().post('/mail/send', json=self._build_payload(job))
+            response.raise_for_status()
+            return True
+        except Exception:
+            logger.exception("Error sending email to %s", job.recipient_email)
+            return False
+    
+    async def send_many(self, jobs):
+        """
+        Send report jobs concurrently over the shared client
+        
+        Returns:
+            list: Per-job success flags, in job order
+        """
+        return list(await asyncio.gather(*[self.send_one(job) for job in jobs]))
+    
+    async def aclose(self):
+        """Close the HTTP client"""
+        if self._client is None:
+            return
+        
+        try:
+            await self._client.aclose()
+        finally:
+            self._client = None
+
+
+_default_service = None
+_default_service_lock = threading.Lock()
 
 
 # Convenience function
@@ -217,9 +566,14 @@ def send_seo_report_email(recipient_email, recipient_name, scan_url, pdf_buffer,
     Returns:
         bool: Success status
     """
+    global _default_service
     try:
-        service = EmailService()
-        return service.send_report(recipient_email, recipient_name, scan_url, pdf_buffer, scan_score)
-    except Exception as e:
-        print(f"Failed to send email: {str(e)}")
+        # Share one service so repeated sends reuse its SMTP connection
+        with _default_service_lock:
+            if _default_service is None:
+                _default_service = EmailService()
+                atexit.register(_default_service.close)
+        return _default_service.send_report(recipient_email, recipient_name, scan_url, pdf_buffer, scan_score)
+    except Exception:
+        logger.exception("Error sending email to %s", recipient_email)
         return False
\ No newline at end of file
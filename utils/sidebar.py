@@ -3,229 +3,307 @@ Add this to your main app.py or each page to customize the sidebar
 This replaces the default navigation with useful features
 """
 
+import functools
+
 import streamlit as st
 
-# Hide default navigation and add custom sidebar
-def setup_sidebar():
-    """Setup custom sidebar with useful features instead of navigation"""
+# Sidebar CSS, built once at import instead of on every rerun
+_SIDEBAR_CSS_FULL = """
+    <style>
+        /* Hide the default navigation */
+        [data-testid="stSidebarNav"] {
+            display: none;
+        }
+        
+        /* Optional: Hide "No Active Plan" warning if you want */
+        .element-container:has(> div > div > div > [data-testid="stNotification"]) {
+            display: none;
+        }
+    </style>
+"""
+
+_SIDEBAR_CSS_MIN = """
+    <style>
+        [data-testid="stSidebarNav"] {display: none;}
+    </style>
+"""
+
+
+@st.cache_resource
+def get_supabase():
+    """Shared Supabase client, reused across reruns and sessions"""
+    from supabase import create_client
+    url = st.secrets.get("SUPABASE_URL")
+    key = st.secrets.get("SUPABASE_SERVICE_ROLE_KEY") or st.secrets.get("SUPABASE_KEY")
+    if not url or not key:
+        return None
+    return create_client(url, key)
+
+
+@st.cache_data(ttl=60)
+def load_profile(user_id):
+    """Profile fields rendered in the sidebar (cached for 60s)"""
+    supabase = get_supabase()
+    if supabase is None:
+        return None
+    return supabase.table('profiles')\
+        .select('tier,credits_balance,monthly_scans_used,monthly_scan_limit')\
+        .eq('id', user_id)\
+        .single()\
+        .execute()\
+        .data
+
+
+@st.cache_data(ttl=300)
+def load_scan_stats(user_id):
+    """Average score and count of the user's completed scans (cached for 5 min)"""
+    supabase = get_supabase()
+    if supabase is None:
+        return None
+    data = supabase.rpc('user_scan_stats', {'uid': user_id}).execute().data
+    return data[0] if data else None
+
+
+def clear_sidebar_cache():
+    """Drop cached sidebar data, e.g. on logout"""
+    load_profile.clear()
+    load_scan_stats.clear()
+
+
+_TIER_BADGES = {'FREE': '🔵', 'PRO': '🟢', 'AGENCY': '🟡', 'ELITE': '🟣'}
+
+# Quick action labels per sidebar mode: (new scan, results, billing);
+# the stats sidebar has no billing button
+_QUICK_ACTION_LABELS = {
+    'full': ("🔍 New Scan", "📊 View Results", "💳 Upgrade Plan"),
+    'minimal': ("🔍 New Scan", "📊 Results", "💳 Billing"),
+    'stats': ("🔍 New Scan", "📊 View Results", None),
+}
+
+
+def _current_user():
+    """(email, user_id) of the logged-in user, or None"""
+    user = st.session_state.get('user')
+    if not user:
+        return None
+    if isinstance(user, dict):
+        return user.get('email'), user.get('id')
+    return user.email, user.id
+
+
+def _render_header(divider=True):
+    """Brand header shared by every sidebar mode"""
+    st.markdown("# 🎯 Nexus SEO")
+    if divider:
+        st.markdown("---")
+
+
+def _render_account():
+    """Account heading and email (full sidebar)"""
+    user = _current_user()
+    if not user:
+        return
+    st.markdown("### 👤 Account")
+    st.write(f"**{user[0]}**")
+
+
+def _render_account_line():
+    """Email only (minimal sidebar)"""
+    user = _current_user()
+    if not user:
+        return
+    st.write(f"👤 {user[0]}")
+    st.markdown("---")
+
+
+def _render_stats():
+    """Plan, credits and scan usage grid; the account is still shown if the profile read fails"""
+    user = _current_user()
+    if not user:
+        return
     
-    # Hide default navigation
-    st.markdown("""
-        <style>
-            /* Hide the default navigation */
-            [data-testid="stSidebarNav"] {
-                display: none;
-            }
-            
-            /* Optional: Hide "No Active Plan" warning if you want */
-            .element-container:has(> div > div > div > [data-testid="stNotification"]) {
-                display: none;
-            }
-        </style>
-    """, unsafe_allow_html=True)
-    
-    # Add custom sidebar content
-    with st.sidebar:
-        # Logo/Brand
-        st.markdown("# 🎯 Nexus SEO")
+    try:
+        profile = load_profile(user[1])
+    except Exception:
+        profile = None
+    
+    if profile:
         st.markdown("---")
+        st.markdown("### 📊 Your Stats")
         
-        # User info section
-        if 'user' in st.session_state and st.session_state.user:
-            user = st.session_state.user
-            email = user.get('email') if isinstance(user, dict) else user.email
-            
-            st.markdown("### 👤 Account")
-            st.write(f"**{email}**")
-            
-            # Get user profile stats
-            try:
-                from supabase import create_client
-                url = st.secrets.get("SUPABASE_URL")
-                key = st.secrets.get("SUPABASE_SERVICE_ROLE_KEY") or st.secrets.get("SUPABASE_KEY")
-                if url and key:
-                    supabase = create_client(url, key)
-                    user_id = user.get('id') if isinstance(user, dict) else user.id
-                    response = supabase.table('profiles').select('*').eq('id', user_id).single().execute()
-                    if response.data:
-                        profile = response.data
-                        
-                        # Show stats
-                        st.markdown("---")
-                        st.markdown("### 📊 Your Stats")
-                        
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.metric("Plan", profile.get('tier', 'FREE').upper())
-                            st.metric("Credits", f"{profile.get('credits_balance', 0):,}")
-                        with col2:
-                            scans_used = profile.get('monthly_scans_used', 0)
-                            scan_limit = profile.get('monthly_scan_limit', 10)
-                            st.metric("Scans", f"{scans_used}/{scan_limit}")
-                            usage_pct = int((scans_used / scan_limit) * 100) if scan_limit > 0 else 0
-                            st.progress(usage_pct / 100)
-            except:
-                pass
-            
-            st.markdown("---")
-        
-        # Quick actions
-        st.markdown("### ⚡ Quick Actions")
-        
-        if st.button("🔍 New Scan", use_container_width=True, type="primary"):
-            st.switch_page("pages/2_New_Scan.py")
-        
-        if st.button("📊 View Results", use_container_width=True):
-            st.switch_page("pages/3_Scan_Results.py")
-        
-        if st.button("💳 Upgrade Plan", use_container_width=True):
-            st.switch_page("pages/4_Billing.py")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Plan", profile.get('tier', 'FREE').upper())
+            st.metric("Credits", f"{profile.get('credits_balance', 0):,}")
+        with col2:
+            scans_used = profile.get('monthly_scans_used', 0)
+            scan_limit = profile.get('monthly_scan_limit', 10)
+            st.metric("Scans", f"{scans_used}/{scan_limit}")
+            usage_pct = int((scans_used / scan_limit) * 100) if scan_limit > 0 else 0
+            st.progress(usage_pct / 100)
+    
+    st.markdown("---")
+
+
+def _render_usage():
+    """Plan badge, monthly usage, scan history and quick actions (stats sidebar)"""
+    user = _current_user()
+    if not user:
+        return
+    
+    # Usage panel and its quick actions only render with a profile
+    try:
+        profile = load_profile(user[1])
+        if not profile:
+            return
         
         st.markdown("---")
         
-        # Settings/Options
-        st.markdown("### ⚙️ Settings")
-        
-        # Theme toggle (optional)
-        # st.checkbox("Dark Mode", value=True)
-        
-        # Notifications
-        enable_notifications = st.checkbox("Email Notifications", value=False)
+        # Plan badge
+        tier = profile.get('tier', 'FREE').upper()
+        st.markdown(f"## {_TIER_BADGES.get(tier, '⚪')} {tier} Plan")
         
-        # Auto-save
-        auto_save = st.checkbox("Auto-save Reports", value=True)
-        
-        st.markdown("---")
+        # Usage this month
+        st.markdown("### This Month")
+        scans_used = profile.get('monthly_scans_used', 0)
+        scan_limit = profile.get('monthly_scan_limit', 10)
         
-        # Resources
-        st.markdown("### 📚 Resources")
+        st.metric("Scans Used", f"{scans_used} / {scan_limit}")
+        st.progress(scans_used / scan_limit if scan_limit > 0 else 0)
         
-        with st.expander("Help & Support"):
-            st.markdown("""
-            - [Documentation](https://docs.example.com)
-            - [Video Tutorials](https://youtube.com)
-            - [Contact Support](mailto:support@nexusseo.com)
-            - [Community Forum](https://forum.example.com)
-            """)
+        st.metric("Credits", f"{profile.get('credits_balance', 0):,}")
         
-        with st.expander("Learn SEO"):
-            st.markdown("""
-            - [SEO Basics Guide](https://example.com/guide)
-            - [Best Practices](https://example.com/best-practices)
-            - [Case Studies](https://example.com/cases)
-            """)
+        stats = load_scan_stats(user[1])
+        if stats and stats.get('total'):
+            st.metric("Avg SEO Score", f"{stats.get('avg_score') or 0}/100")
+            st.metric("Total Scans", stats['total'])
         
         st.markdown("---")
         
-        # Logout
-        if st.button("🚪 Logout", use_container_width=True):
-            # Clear session
-            for key in list(st.session_state.keys()):
-                del st.session_state[key]
-            st.switch_page("app.py")
-        
-        # Footer
-        st.markdown("---")
-        st.caption("Nexus SEO Intelligence v1.0")
-        st.caption("© 2025 All rights reserved")
+        _render_quick_actions(_QUICK_ACTION_LABELS['stats'], scans_used=scans_used, scan_limit=scan_limit)
+    except Exception as e:
+        st.error(f"Error loading stats: {e}")
 
 
-# Alternative: Minimal sidebar (just essentials)
-def setup_minimal_sidebar():
-    """Minimal sidebar with just account info and quick actions"""
+def _render_quick_actions(labels, heading=None, scans_used=None, scan_limit=None):
+    """Navigation buttons; with usage given, offers an upgrade instead of a new scan at the limit"""
+    new_scan_label, results_label, billing_label = labels
+    
+    if heading:
+        st.markdown(heading)
+    
+    if scan_limit is not None and scans_used >= scan_limit:
+        st.warning("⚠️ Scan limit reached")
+        if st.button("💳 Upgrade", use_container_width=True, type="primary"):
+            st.switch_page("pages/4_Billing.py")
+    elif st.button(new_scan_label, use_container_width=True, type="primary"):
+        st.switch_page("pages/2_New_Scan.py")
+    
+    if st.button(results_label, use_container_width=True):
+        st.switch_page("pages/3_Scan_Results.py")
+    
+    if billing_label and st.button(billing_label, use_container_width=True):
+        st.switch_page("pages/4_Billing.py")
+
+
+def _render_settings_and_resources():
+    """Settings toggles and help links (full sidebar only)"""
+    st.markdown("---")
+    st.markdown("### ⚙️ Settings")
+    
+    # Theme toggle (optional)
+    # st.checkbox("Dark Mode", value=True)
+    
+    st.checkbox("Email Notifications", value=False)
+    st.checkbox("Auto-save Reports", value=True)
+    
+    st.markdown("---")
+    
+    # Resources
+    st.markdown("### 📚 Resources")
+    
+    with st.expander("Help & Support"):
+        st.markdown("""
+        - [Documentation](https://docs.example.com)
+        - [Video Tutorials](https://youtube.com)
+        - [Contact Support](mailto:support@nexusseo.com)
+        - [Community Forum](https://forum.example.com)
+        """)
     
+    with st.expander("Learn SEO"):
+        st.markdown("""
+        - [SEO Basics Guide](https://example.com/guide)
+        - [Best Practices](https://example.com/best-practices)
+        - [Case Studies](https://example.com/cases)
+        """)
+
+
+def _render_logout():
+    """Logout button, preceded by a divider; clears the session and cached sidebar data"""
+    st.markdown("---")
+    if st.button("🚪 Logout", use_container_width=True):
+        clear_sidebar_cache()
+        st.session_state.clear()
+        st.switch_page("app.py")
+
+
+def _render_footer():
+    """Version and copyright (full sidebar only)"""
+    st.markdown("---")
+    st.caption("Nexus SEO Intelligence v1.0")
+    st.caption("© 2025 All rights reserved")
+
+
+# Sections rendered, in order, by each sidebar mode
+_SIDEBAR_SECTIONS = {
+    'full': [
+        _render_header,
+        _render_account,
+        _render_stats,
+        functools.partial(_render_quick_actions, _QUICK_ACTION_LABELS['full'], heading="### ⚡ Quick Actions"),
+        _render_settings_and_resources,
+        _render_logout,
+        _render_footer,
+    ],
+    'minimal': [
+        _render_header,
+        _render_account_line,
+        functools.partial(_render_quick_actions, _QUICK_ACTION_LABELS['minimal']),
+        _render_logout,
+    ],
+    'stats': [
+        # The usage panel opens with its own divider
+        functools.partial(_render_header, divider=False),
+        _render_usage,
+        _render_logout,
+    ],
+}
+
+
+# Hide default navigation and add custom sidebar
+def setup_sidebar(mode='full'):
+    """
+    Setup custom sidebar with useful features instead of navigation
+    
+    Args:
+        mode: 'full' (account, stats, settings, resources), 'minimal'
+            (account and quick actions) or 'stats' (usage and scan history)
+    """
     # Hide default navigation
-    st.markdown("""
-        <style>
-            [data-testid="stSidebarNav"] {display: none;}
-        </style>
-    """, unsafe_allow_html=True)
+    st.markdown(_SIDEBAR_CSS_FULL if mode == 'full' else _SIDEBAR_CSS_MIN, unsafe_allow_html=True)
     
     with st.sidebar:
-        st.markdown("# 🎯 Nexus SEO")
-        st.markdown("---")
-        
-        # User section
-        if 'user' in st.session_state and st.session_state.user:
-            user = st.session_state.user
-            email = user.get('email') if isinstance(user, dict) else user.email
-            st.write(f"👤 {email}")
-            st.markdown("---")
-        
-        # Quick actions only
-        st.button("🔍 New Scan", use_container_width=True, type="primary", on_click=lambda: st.switch_page("pages/2_New_Scan.py"))
-        st.button("📊 Results", use_container_width=True, on_click=lambda: st.switch_page("pages/3_Scan_Results.py"))
-        st.button("💳 Billing", use_container_width=True, on_click=lambda: st.switch_page("pages/4_Billing.py"))
-        
-        st.markdown("---")
-        st.button("🚪 Logout", use_container_width=True, on_click=lambda: [st.session_state.clear(), st.switch_page("app.py")])
+        for render in _SIDEBAR_SECTIONS[mode]:
+            render()
+
+
+# Alternative: Minimal sidebar (just essentials)
+def setup_minimal_sidebar():
+    """Minimal sidebar with just account info and quick actions"""
+    setup_sidebar(mode='minimal')
 
 
 # Alternative: Stats-focused sidebar
 def setup_stats_sidebar():
     """Sidebar focused on showing user stats and progress"""
-    
-    st.markdown("""
-        <style>
-            [data-testid="stSidebarNav"] {display: none;}
-        </style>
-    """, unsafe_allow_html=True)
-    
-    with st.sidebar:
-        st.markdown("# 🎯 Nexus SEO")
-        
-        if 'user' in st.session_state and st.session_state.user:
-            try:
-                from supabase import create_client
-                url = st.secrets.get("SUPABASE_URL")
-                key = st.secrets.get("SUPABASE_SERVICE_ROLE_KEY") or st.secrets.get("SUPABASE_KEY")
-                supabase = create_client(url, key)
-                
-                user = st.session_state.user
-                user_id = user.get('id') if isinstance(user, dict) else user.id
-                
-                # Get profile
-                profile = supabase.table('profiles').select('*').eq('id', user_id).single().execute().data
-                
-                if profile:
-                    st.markdown("---")
-                    
-                    # Plan badge
-                    tier = profile.get('tier', 'FREE').upper()
-                    tier_colors = {'FREE': '🔵', 'PRO': '🟢', 'AGENCY': '🟡', 'ELITE': '🟣'}
-                    st.markdown(f"## {tier_colors.get(tier, '⚪')} {tier} Plan")
-                    
-                    # Usage this month
-                    st.markdown("### This Month")
-                    scans_used = profile.get('monthly_scans_used', 0)
-                    scan_limit = profile.get('monthly_scan_limit', 10)
-                    
-                    st.metric("Scans Used", f"{scans_used} / {scan_limit}")
-                    st.progress(scans_used / scan_limit if scan_limit > 0 else 0)
-                    
-                    st.metric("Credits", f"{profile.get('credits_balance', 0):,}")
-                    
-                    # Get scan stats
-                    scans = supabase.table('seo_scans').select('seo_score').eq('user_id', user_id).eq('status', 'completed').execute().data
-                    
-                    if scans and len(scans) > 0:
-                        avg_score = sum(s.get('seo_score', 0) for s in scans) / len(scans)
-                        st.metric("Avg SEO Score", f"{avg_score:.0f}/100")
-                        st.metric("Total Scans", len(scans))
-                    
-                    st.markdown("---")
-                    
-                    # Quick actions
-                    if scans_used >= scan_limit:
-                        st.warning("⚠️ Scan limit reached")
-                        st.button("💳 Upgrade", use_container_width=True, type="primary", on_click=lambda: st.switch_page("pages/4_Billing.py"))
-                    else:
-                        st.button("🔍 New Scan", use_container_width=True, type="primary", on_click=lambda: st.switch_page("pages/2_New_Scan.py"))
-                    
-                    st.button("📊 View Results", use_container_width=True, on_click=lambda: st.switch_page("pages/3_Scan_Results.py"))
-                    
-            except Exception as e:
-                st.error(f"Error loading stats: {e}")
-        
-        st.markdown("---")
-        st.button("🚪 Logout", use_container_width=True)
\ No newline at end of file
+    setup_sidebar(mode='stats')
@@ -0,0 +1,86 @@
+"""
+Stripe/Supabase client helpers shared by the billing service and the webhook server
+
+Importing this module has no side effects: nothing is configured until a
+helper is called.
+"""
+
+import re
+import time
+import hmac
+import hashlib
+import httpx
+import requests
+import stripe
+from typing import Optional
+from supabase import Client, ClientOptions, create_client
+
+# A Stripe-Signature v1 signature is a hex SHA256 digest
+_SIGNATURE_V1_RE = re.compile(r'[0-9a-f]{64}')
+WEBHOOK_TOLERANCE = 300  # seconds, same as stripe.Webhook.DEFAULT_TOLERANCE
+
+
+def create_stripe_http_client() -> stripe.RequestsClient:
+    """
+    Create a Stripe HTTP client backed by a pooled keep-alive session;
+    assign it to stripe.default_http_client.
+    """
+    session = requests.Session()
+    session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=20))
+    return stripe.RequestsClient(session=session)
+
+
+def verify_stripe_signature(payload, sig_header: Optional[str], secret: bytes, tolerance: int = WEBHOOK_TOLERANCE):
+    """
+    Verify the Stripe-Signature header over the raw payload.
+    
+    Malformed headers and stale timestamps are rejected before any hashing;
+    otherwise a single HMAC-SHA256 is computed and compared in constant time
+    against each v1 signature. The payload is not parsed.
+    
+    Args:
+        secret: Webhook signing secret, already UTF-8 encoded (encode it once at startup)
+    
+    Raises:
+        stripe.error.SignatureVerificationError: If the header is malformed, the timestamp is stale or no signature matches
+    """
+    timestamp = None
+    signatures = []
+    for item in (sig_header or '').split(','):
+        key, _, value = item.strip().partition('=')
+        if key == 't':
+            timestamp = value
+        elif key == 'v1' and _SIGNATURE_V1_RE.fullmatch(value):
+            signatures.append(value)
+    
+    if not secret or not timestamp or not timestamp.isdigit() or not signatures:
+        raise stripe.error.SignatureVerificationError(
+            "Unable to extract timestamp and signatures from header", sig_header
+        )
+    
+    if abs(time.time() - int(timestamp)) > tolerance:
+        raise stripe.error.SignatureVerificationError(
+            "Timestamp outside the tolerance zone", sig_header
+        )
+    
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    
+    expected = hmac.new(secret, timestamp.encode() + b'.' + payload, hashlib.sha256).hexdigest()
+    if not any(hmac.compare_digest(expected, signature) for signature in signatures):
+        raise stripe.error.SignatureVerificationError(
+            "No signatures found matching the expected signature for payload", sig_header
+        )
+
+
+def create_supabase_client(url: str, key: str) -> Client:
+    """
+    Create a Supabase client backed by a pooled keep-alive HTTP/2 client,
+    so TLS connections are reused across webhook events.
+    """
+    http_client = httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=50, keepalive_expiry=60),
+        timeout=5
+    )
+    return create_client(url, key, options=ClientOptions(httpx_client=http_client))
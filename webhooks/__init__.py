@@ -0,0 +1,5 @@
+"""
+Webhooks Package
+Stripe webhook server for Nexus SEO (see webhooks.app) and its Redis
+event queue (webhooks.queue)
+"""
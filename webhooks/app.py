@@ -0,0 +1,565 @@
+"""
+Stripe Webhook Handler
+This is a separate Flask server that handles Stripe webhooks
+Run this separately from your Streamlit app
+
+Usage (from the project root):
+    python -m webhooks.app            # development server
+    python -m webhooks.app worker     # queue worker (when REDIS_URL is set)
+    gunicorn webhooks.app:app -c gunicorn.conf.py   # production
+"""
+
+from flask import Flask, Response, request
+import orjson
+import stripe
+import os
+from utils.stripe_helpers import create_stripe_http_client, create_supabase_client, verify_stripe_signature
+import functools
+import logging
+import operator
+import sys
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+from prometheus_client import REGISTRY, Histogram, start_http_server
+from prometheus_client.core import GaugeMetricFamily
+from .queue import STREAM, redis, get_redis, claim_event, enqueue_event, run_worker
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging (LOG_LEVEL=INFO for per-event logs)
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'WARNING').upper())
+logger = logging.getLogger(__name__)
+
+app = Flask(__name__)
+app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY')
+
+# Prometheus metrics, served on an internal port rather than the public webhook
+# port: WEB_METRICS_PORT for the web server (under gunicorn the master serves the
+# aggregate of all workers, see gunicorn.conf.py), METRICS_PORT for the queue worker,
+# which also exports the queue depth
+METRICS_REGISTRY = REGISTRY
+HANDLER_SECONDS = Histogram('stripe_webhook_seconds', 'Webhook handler time', ['event_type'])
+
+_SECRET_KEYS = ('STRIPE_SECRET_KEY', 'STRIPE_WEBHOOK_SECRET', 'SUPABASE_URL', 'SUPABASE_KEY')
+
+# Environment variables first; secrets.toml is only parsed when some are missing
+@functools.lru_cache(maxsize=1)
+def load_secrets():
+    """Load secrets from environment variables or secrets.toml"""
+    secrets = {key: os.getenv(key) for key in _SECRET_KEYS}
+    # Prefer the service role key; webhook writes bypass RLS
+    secrets['SUPABASE_KEY'] = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or secrets['SUPABASE_KEY']
+    
+    if all(secrets.values()):
+        logger.info("✅ Loaded secrets from environment variables")
+        return secrets
+    
+    # Fill the missing values from secrets.toml
+    secrets_path = Path(".streamlit/secrets.toml")
+    if secrets_path.exists():
+        try:
+            import toml
+            config = toml.load(secrets_path)
+            secrets = {key: secrets[key] or config.get(key) for key in _SECRET_KEYS}
+            logger.info("✅ Loaded secrets from secrets.toml")
+        except Exception as e:
+            logger.warning("Could not load secrets.toml: %s", e)
+    
+    if not all(secrets.values()):
+        logger.error("❌ Missing required secrets!")
+        logger.error("Set them in .streamlit/secrets.toml or environment variables")
+        return None
+    
+    return secrets
+
+# Load configuration
+config = load_secrets()
+if not config:
+    logger.error("Failed to load configuration. Exiting.")
+    exit(1)
+
+STRIPE_SECRET_KEY, STRIPE_WEBHOOK_SECRET, SUPABASE_URL, SUPABASE_KEY = operator.itemgetter(*_SECRET_KEYS)(config)
+
+# Signing key for verify_stripe_signature, encoded once
+STRIPE_WEBHOOK_KEY = STRIPE_WEBHOOK_SECRET.encode('utf-8')
+
+# Initialize Stripe (pooled keep-alive connections)
+stripe.api_key = STRIPE_SECRET_KEY
+stripe.default_http_client = create_stripe_http_client()
+logger.info("✅ Stripe initialized")
+
+# Initialize Supabase (pooled keep-alive connections)
+try:
+    supabase = create_supabase_client(SUPABASE_URL, SUPABASE_KEY)
+    logger.info("✅ Supabase initialized")
+except Exception as e:
+    logger.error("❌ Failed to initialize Supabase: %s", e)
+    exit(1)
+
+# Event queue (optional) - without REDIS_URL events are processed inline
+redis_client = get_redis()
+
+class QueueDepthCollector:
+    """
+    Webhook stream length, read at scrape time; omitted while Redis is unreachable
+    
+    Registered by the queue worker only: gunicorn's master exports just the
+    multiprocess samples, so a collector in a web worker would never be scraped.
+    """
+    
+    def describe(self):
+        return []
+    
+    def collect(self):
+        try:
+            depth = redis_client.xlen(STREAM)
+        except redis.RedisError as e:
+            logger.warning("Could not read webhook queue depth: %s", e)
+            return
+        yield GaugeMetricFamily('stripe_webhook_queue_depth', 'Events in the webhook stream', value=depth)
+
+# Per-tier scan limit and monthly credits granted on each paid subscription invoice
+TIER_CONFIG = {
+    'demo': {'scan_limit': 2, 'monthly_credits': 0},  # after cancellation
+    'pro': {'scan_limit': 50, 'monthly_credits': 10000},
+    'agency': {'scan_limit': 200, 'monthly_credits': 50000},
+    'elite': {'scan_limit': 999999, 'monthly_credits': 200000},  # Unlimited scans
+}
+
+# Last-resort tier lookup via the Stripe API (one extra round trip per invoice)
+STRIPE_TIER_LOOKUP = os.getenv('STRIPE_TIER_LOOKUP', 'false').lower() == 'true'
+
+# Stripe price ID -> (loaded_at, (tier, monthly_credits)), from price metadata
+PRICE_CACHE_TTL = 86400
+PRICE_CACHE_MIN_REFRESH = 300  # unknown price IDs trigger at most one reload per window
+_price_cache = {}
+_price_cache_loaded_at = 0.0
+
+def warm_price_cache():
+    """Load tier/credits metadata for all active prices"""
+    global _price_cache_loaded_at
+    now = time.time()
+    for price in stripe.Price.list(active=True).auto_paging_iter():
+        metadata = price.get('metadata') or {}
+        _price_cache[price.id] = (now, (metadata.get('tier'), int(metadata.get('credits', 0))))
+    _price_cache_loaded_at = now
+
+def get_price_info(price_id):
+    """Return (tier, monthly_credits) for a price, reloading lazily when stale or missing"""
+    entry = _price_cache.get(price_id)
+    now = time.time()
+    
+    if (entry is None or now - entry[0] > PRICE_CACHE_TTL) and now - _price_cache_loaded_at > PRICE_CACHE_MIN_REFRESH:
+        try:
+            warm_price_cache()
+        except stripe.error.StripeError as e:
+            logger.error("Error loading Stripe prices: %s", e)
+        entry = _price_cache.get(price_id)
+    
+    return entry[1] if entry else None
+
+def update_user_subscription(customer_id, subscription_id, status, tier):
+    """Update user subscription in database"""
+    try:
+        update_data = {
+            'p_customer_id': customer_id,
+            'p_subscription_id': subscription_id,
+            'p_status': status,
+            'p_tier': tier,
+            'p_scan_limit': None
+        }
+        
+        # Set limits based on tier
+        cfg = TIER_CONFIG.get(tier)
+        if cfg:
+            update_data['p_scan_limit'] = cfg['scan_limit']
+        
+        # Tier, status and limits in one atomic UPDATE; credits are only
+        # granted by paid invoices (handle_invoice_paid)
+        response = supabase.rpc('apply_subscription_update', update_data).execute()
+        
+        if response.data is not None:
+            user_id = response.data
+            logger.info("Updated subscription for user %s: %s - %s", user_id, tier, status)
+            return True
+        else:
+            logger.warning("User not found for customer_id: %s", customer_id)
+            return False
+            
+    except Exception as e:
+        logger.error("Error updating subscription: %s", e)
+        return False
+
+def add_credits_to_user(customer_id, credits):
+    """Add credits to user account"""
+    try:
+        # Atomic increment in Postgres; concurrent webhooks cannot lose an update
+        response = supabase.rpc('add_credits', {
+            'p_customer_id': customer_id,
+            'p_delta': credits
+        }).execute()
+        
+        if response.data is not None:
+            new_credits = response.data
+            logger.info("Added %s credits to customer %s. New balance: %s", credits, customer_id, new_credits)
+            return True
+        else:
+            logger.warning("User not found for customer_id: %s", customer_id)
+            return False
+            
+    except Exception as e:
+        logger.error("Error adding credits: %s", e)
+        return False
+
+def grant_invoice_credits(customer_id, invoice_id, credits, tier):
+    """Grant a paid invoice's subscription credits, at most once per invoice"""
+    try:
+        response = supabase.rpc('grant_invoice_credits', {
+            'p_customer_id': customer_id,
+            'p_invoice_id': invoice_id,
+            'p_amount': credits,
+            'p_description': f"Monthly credits for {tier.title()} subscription"
+        }).execute()
+        
+        if response.data is not None:
+            logger.info("Granted invoice %s credits to customer %s. Balance: %s", invoice_id, customer_id, response.data)
+            return True
+        else:
+            logger.warning("User not found for customer_id: %s", customer_id)
+            return False
+            
+    except Exception as e:
+        logger.error("Error granting invoice credits: %s", e)
+        return False
+
+def create_stripe_customer_if_needed(user_id, email):
+    """Create Stripe customer if user doesn't have one"""
+    try:
+        # Check if user already has a customer ID
+        response = supabase.table('profiles')\
+            .select('stripe_customer_id')\
+            .eq('id', user_id)\
+            .single()\
+            .execute()
+        
+        if response.data and response.data.get('stripe_customer_id'):
+            return response.data['stripe_customer_id']
+        
+        # Create new Stripe customer
+        customer = stripe.Customer.create(
+            email=email,
+            metadata={'user_id': user_id}
+        )
+        
+        # Update database
+        supabase.table('profiles')\
+            .update({'stripe_customer_id': customer.id})\
+            .eq('id', user_id)\
+            .execute()
+        
+        logger.info("Created Stripe customer %s for user %s", customer.id, user_id)
+        return customer.id
+        
+    except Exception as e:
+        logger.error("Error creating Stripe customer: %s", e)
+        return None
+
+# Warm the price cache at startup; a failure here is retried lazily on first use
+try:
+    warm_price_cache()
+    logger.info("✅ Loaded %s Stripe prices", len(_price_cache))
+except stripe.error.StripeError as e:
+    logger.warning("Could not load Stripe prices: %s", e)
+
+def json_response(body, status=200):
+    """JSON response encoded with orjson"""
+    return Response(orjson.dumps(body), status=status, mimetype='application/json')
+
+@app.route('/webhook', methods=['POST'])
+def webhook():
+    """Handle Stripe webhook events"""
+    payload = request.data
+    sig_header = request.headers.get('Stripe-Signature')
+    
+    try:
+        # Reject unsigned/forged/stale requests before any JSON parsing,
+        # then parse with orjson
+        verify_stripe_signature(payload, sig_header, STRIPE_WEBHOOK_KEY)
+        event = orjson.loads(payload)
+        
+        logger.info("Received event: %s", event['type'])
+        
+        # Ack immediately; a worker logs and handles the event
+        if redis_client is not None:
+            if not claim_event(redis_client, event):
+                return json_response({'status': 'duplicate'})
+            enqueue_event(redis_client, payload, event)
+            return json_response({'status': 'queued'})
+        
+        dispatch_event(event, payload)
+        return json_response({'status': 'success'})
+    
+    # Bad signatures are the common failure (probes), so check them first.
+    # Anything else propagates: Flask logs it and answers 500, and Stripe retries.
+    except stripe.error.SignatureVerificationError as e:
+        logger.error("Invalid signature: %s", e)
+        return json_response({'error': 'Invalid signature'}, 400)
+    
+    except ValueError as e:
+        logger.error("Invalid payload: %s", e)
+        return json_response({'error': 'Invalid payload'}, 400)
+
+def dispatch_event(event, payload):
+    """
+    Log an event and run its handler, skipping events already processed
+    
+    Raises:
+        RuntimeError: If the handler reports a failed write; the event is not
+            marked processed
+    """
+    if not log_webhook_event(event, payload):
+        logger.info("Skipping already processed event %s", event['id'])
+        return
+    
+    handler = _HANDLERS.get(event['type'])
+    if handler:
+        with HANDLER_SECONDS.labels(event['type']).time():
+            ok = handler(event['data']['object'])
+        # Leave the event unprocessed so the retry (queue or Stripe) runs it again
+        if not ok:
+            raise RuntimeError(f"Handler for {event['type']} failed on event {event['id']}")
+    else:
+        logger.info("Unhandled event type: %s", event['type'])
+    
+    supabase.table('webhook_events').update({'processed': True}).eq('event_id', event['id']).execute()
+
+def log_webhook_event(event, payload):
+    """
+    Log webhook event to database
+    
+    The raw request body is stored as-is and parsed into jsonb by Postgres,
+    so the event is never re-serialized in Python.
+    
+    Returns:
+        bool: False if the event was already processed, True otherwise
+    """
+    try:
+        response = supabase.rpc('insert_webhook_event', {
+            'p_event_id': event['id'],
+            'p_event_type': event['type'],
+            'p_payload': payload.decode('utf-8') if isinstance(payload, bytes) else payload
+        }).execute()
+        return response.data is not False
+    except Exception as e:
+        logger.error("Error logging webhook event: %s", e)
+        return True
+
+def handle_checkout_completed(session):
+    """Handle completed checkout session"""
+    customer_id = session.get('customer')
+    client_reference_id = session.get('client_reference_id')  # This is the user_id
+    mode = session.get('mode')
+    metadata = session.get('metadata', {})
+    
+    logger.info("Checkout completed for customer %s, user %s", customer_id, client_reference_id)
+    
+    # Update user with customer ID if not already set
+    if client_reference_id and customer_id:
+        try:
+            supabase.table('profiles')\
+                .update({'stripe_customer_id': customer_id})\
+                .eq('id', client_reference_id)\
+                .execute()
+        except Exception as e:
+            logger.error("Error updating customer ID: %s", e)
+            return False
+    
+    # Handle credit pack purchases (one-time payments)
+    if mode == 'payment':
+        credits = int(metadata.get('credits', 0))
+        if credits > 0 and customer_id:
+            return add_credits_to_user(customer_id, credits)
+    
+    return True
+
+def handle_subscription_created(subscription):
+    """Handle new subscription"""
+    customer_id = subscription['customer']
+    subscription_id = subscription['id']
+    status = subscription['status']
+    metadata = subscription.get('metadata', {})
+    tier = metadata.get('tier', 'pro')
+    
+    logger.info("Subscription created: %s for customer %s", subscription_id, customer_id)
+    
+    if status == 'active':
+        return update_user_subscription(customer_id, subscription_id, status, tier)
+    return True
+
+def handle_subscription_updated(subscription):
+    """Handle subscription updates"""
+    customer_id = subscription['customer']
+    subscription_id = subscription['id']
+    status = subscription['status']
+    metadata = subscription.get('metadata', {})
+    tier = metadata.get('tier', 'pro')
+    
+    logger.info("Subscription updated: %s - %s", subscription_id, status)
+    
+    return update_user_subscription(customer_id, subscription_id, status, tier)
+
+def handle_subscription_deleted(subscription):
+    """Handle subscription cancellation"""
+    customer_id = subscription['customer']
+    subscription_id = subscription['id']
+    
+    logger.info("Subscription deleted: %s", subscription_id)
+    
+    # Set subscription to canceled and downgrade to the demo tier
+    return update_user_subscription(customer_id, subscription_id, 'canceled', 'demo')
+
+def handle_invoice_paid(invoice):
+    """Handle successful invoice payment"""
+    customer_id = invoice['customer']
+    subscription_id = invoice.get('subscription')
+    
+    logger.info("Invoice paid for customer %s", customer_id)
+    
+    # If it's a subscription renewal, add credits
+    if subscription_id:
+        lines = invoice.get('lines', {}).get('data', [])
+        price_id = (lines[0].get('price') or {}).get('id') if lines else None
+        tier, credits = (price_id and get_price_info(price_id)) or (None, 0)
+        
+        if not tier:
+            tier = get_invoice_tier(invoice)
+        
+        # Add monthly credits based on tier
+        cfg = TIER_CONFIG.get(tier)
+        credits = credits or (cfg and cfg['monthly_credits'])
+        if credits:
+            return grant_invoice_credits(customer_id, invoice['id'], credits, tier)
+    
+    return True
+
+def get_invoice_tier(invoice):
+    """Resolve the subscription tier for an invoice without calling Stripe if possible"""
+    # Subscription metadata is copied onto the invoice
+    tier = (invoice.get('subscription_details') or {}).get('metadata', {}).get('tier')
+    if tier:
+        return tier
+    
+    lines = invoice.get('lines', {}).get('data', [])
+    if lines:
+        tier = lines[0].get('metadata', {}).get('tier')
+        if tier:
+            return tier
+    
+    # Current tier of the customer's profile
+    try:
+        response = supabase.table('profiles')\
+            .select('tier')\
+            .eq('stripe_customer_id', invoice['customer'])\
+            .limit(1)\
+            .execute()
+        if response.data:
+            return response.data[0]['tier']
+    except Exception as e:
+        logger.error("Error reading tier for customer %s: %s", invoice['customer'], e)
+    
+    if STRIPE_TIER_LOOKUP:
+        subscription = stripe.Subscription.retrieve(invoice['subscription'])
+        return subscription.get('metadata', {}).get('tier', 'pro')
+    
+    return 'pro'
+
+def handle_invoice_failed(invoice):
+    """Handle failed invoice payment"""
+    customer_id = invoice['customer']
+    subscription_id = invoice.get('subscription')
+    
+    logger.warning("Invoice payment failed for customer %s", customer_id)
+    
+    # Update subscription status to past_due
+    if subscription_id:
+        supabase.table('subscriptions')\
+            .update({'status': 'past_due'})\
+            .eq('stripe_subscription_id', subscription_id)\
+            .execute()
+    
+    # Optionally: send email notification, etc.
+    return True
+
+def handle_payment_succeeded(intent):
+    """Handle successful one-time payment"""
+    customer_id = intent.get('customer')
+    metadata = intent.get('metadata', {})
+    
+    logger.info("Payment succeeded for customer %s", customer_id)
+    
+    # Handle credit pack purchases
+    credits = int(metadata.get('credits', 0))
+    if credits > 0 and customer_id:
+        return add_credits_to_user(customer_id, credits)
+    return True
+
+# Event type -> handler, called with the event's data object; handlers
+# return False when a database write failed
+_HANDLERS = {
+    'checkout.session.completed': handle_checkout_completed,
+    'customer.subscription.created': handle_subscription_created,
+    'customer.subscription.updated': handle_subscription_updated,
+    'customer.subscription.deleted': handle_subscription_deleted,
+    'invoice.payment_succeeded': handle_invoice_paid,
+    'invoice.payment_failed': handle_invoice_failed,
+    'payment_intent.succeeded': handle_payment_succeeded,
+}
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Health check endpoint"""
+    return json_response({'status': 'healthy', 'service': 'webhooks'})
+
+@app.route('/', methods=['GET'])
+def index():
+    """Root endpoint"""
+    return json_response({
+        'service': 'Nexus SEO Webhook Server',
+        'status': 'running',
+        'endpoints': {
+            'webhook': '/webhook (POST)',
+            'health': '/health (GET)'
+        }
+    })
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['worker']:
+        if redis_client is None:
+            logger.error("❌ REDIS_URL is not set; the worker has no queue to consume")
+            sys.exit(1)
+        METRICS_REGISTRY.register(QueueDepthCollector())
+        start_http_server(int(os.getenv('METRICS_PORT', 9100)), registry=METRICS_REGISTRY)
+        run_worker(redis_client, dispatch_event)
+        # The consumer loop only returns on a bug; never fall through to the web server
+        sys.exit(1)
+    else:
+        port = int(os.getenv('PORT', 8000))
+        metrics_port = int(os.getenv('WEB_METRICS_PORT', 9101))
+        debug = os.getenv('FLASK_ENV') == 'development'
+        
+        # The reloader re-runs this module in a child process; only that one serves
+        if not debug or os.getenv('WERKZEUG_RUN_MAIN') == 'true':
+            start_http_server(metrics_port, registry=METRICS_REGISTRY)
+        
+        logger.info("=" * 60)
+        logger.info("🚀 Starting Nexus SEO Webhook Server")
+        logger.info("=" * 60)
+        logger.info("📍 Webhook endpoint: http://localhost:%s/webhook", port)
+        logger.info("💚 Health check: http://localhost:%s/health", port)
+        logger.info("📈 Metrics: http://localhost:%s/metrics", metrics_port)
+        logger.info("=" * 60)
+        
+        # Debugger and reloader only in local development; production runs under gunicorn
+        app.run(host='0.0.0.0', port=port, debug=debug)
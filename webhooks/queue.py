@@ -0,0 +1,173 @@
+"""
+Redis Streams queue for Stripe webhook events
+
+The webhook route verifies the signature, enqueues the raw payload and
+acknowledges Stripe immediately. Worker processes drain the stream through
+a consumer group and run the event handlers, so several workers can share
+the load and an event is only XACKed once its database writes succeeded.
+
+Usage (worker):
+    python -m webhooks.app worker
+"""
+
+import os
+import socket
+import functools
+import logging
+import time
+
+import orjson
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+STREAM = os.getenv('WEBHOOK_STREAM', 'stripe:events')
+GROUP = os.getenv('WEBHOOK_GROUP', 'webhook-workers')
+DEAD_LETTER_STREAM = os.getenv('WEBHOOK_DEAD_LETTER_STREAM', f'{STREAM}:dead')
+
+# Entries left pending this long (failed handler, crashed worker) are claimed
+# again by a running worker; after MAX_DELIVERIES attempts they are dead-lettered
+CLAIM_IDLE_MS = int(os.getenv('WEBHOOK_CLAIM_IDLE_MS', 60000))
+MAX_DELIVERIES = int(os.getenv('WEBHOOK_MAX_DELIVERIES', 5))
+
+# How long processed event IDs are remembered (Stripe retries for up to 3 days,
+# but nearly all redeliveries arrive within hours)
+EVENT_DEDUPE_TTL = 86400
+
+
+def get_redis():
+    """Redis client from REDIS_URL, or None when the queue is not configured"""
+    url = os.getenv('REDIS_URL')
+    if redis is None or not url:
+        return None
+    return redis.Redis.from_url(url)
+
+
+# SET NX the event ID, then (subscription events only) compare-and-set the
+# newest `created` seen for the subscription, atomically in one round trip
+_CLAIM_SCRIPT = """
+if not redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[1]) then
+    return 0
+end
+if KEYS[2] then
+    local latest = redis.call('GET', KEYS[2])
+    if latest and tonumber(latest) > tonumber(ARGV[2]) then
+        return 0
+    end
+    redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[1])
+end
+return 1
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def _claim_script(r):
+    """The claim script registered on a client, hashed once per client"""
+    return r.register_script(_CLAIM_SCRIPT)
+
+
+def claim_event(r, event):
+    """
+    Claim an event for processing; False if it should be skipped
+
+    Stripe redelivers events, so the event ID is claimed with SET NX. Resends
+    of subscription events that arrive after a newer event for the same
+    subscription are dropped too, so a stale status never overwrites a fresh one.
+    Both checks run in one Lua script, so concurrent events cannot interleave.
+    """
+    keys = [f"evt:{event['id']}"]
+    if event['type'].startswith('customer.subscription.'):
+        keys.append(f"sub:{event['data']['object']['id']}:created")
+
+    return bool(_claim_script(r)(keys=keys, args=[EVENT_DEDUPE_TTL, event['created']]))
+
+
+def enqueue_event(r, payload, event):
+    """
+    Append a verified event's raw payload to the stream
+
+    If the append fails the claim is released, so Stripe's retry is accepted.
+    """
+    try:
+        r.xadd(STREAM, {'payload': payload, 'type': event['type'], 'id': event['id']})
+    except Exception:
+        r.delete(f"evt:{event['id']}")
+        raise
+
+
+def run_worker(r, dispatch, consumer=None, count=10, block_ms=5000):
+    """
+    Process queued events forever
+
+    Args:
+        r: Redis client
+        dispatch: Callable taking the decoded event dict and the raw payload
+        consumer: Consumer name within the group (default: WORKER_NAME or the
+            hostname, stable across restarts)
+        count: Max entries read per call
+        block_ms: How long XREADGROUP blocks waiting for new entries
+    """
+    consumer = consumer or os.getenv('WORKER_NAME') or socket.gethostname()
+
+    try:
+        r.xgroup_create(STREAM, GROUP, id='0', mkstream=True)
+    except redis.exceptions.ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+    logger.info("Worker %s consuming %s (group %s)", consumer, STREAM, GROUP)
+
+    last_claim = None
+    while True:
+        # Retry entries whose handler failed or whose worker died, from any consumer
+        if last_claim is None or time.monotonic() - last_claim >= CLAIM_IDLE_MS / 1000:
+            last_claim = time.monotonic()
+            _process(r, dispatch, _reclaim(r, consumer, count))
+
+        entries = r.xreadgroup(GROUP, consumer, {STREAM: '>'}, count=count, block=block_ms)
+        if entries:
+            _process(r, dispatch, entries[0][1])
+
+
+def _reclaim(r, consumer, count):
+    """
+    Claim entries pending longer than CLAIM_IDLE_MS
+
+    Entries delivered more than MAX_DELIVERIES times are moved to
+    DEAD_LETTER_STREAM instead of being returned.
+    """
+    messages = r.xautoclaim(STREAM, GROUP, consumer, CLAIM_IDLE_MS, start_id='0-0', count=count)[1]
+
+    retry = []
+    for message_id, fields in messages:
+        if fields is None:
+            # Trimmed from the stream while pending (Redis < 7)
+            continue
+        pending = r.xpending_range(STREAM, GROUP, min=message_id, max=message_id, count=1)
+        if pending and pending[0]['times_delivered'] > MAX_DELIVERIES:
+            logger.error("Dead-lettering event %s after %s attempts", message_id, MAX_DELIVERIES)
+            pipe = r.pipeline()
+            pipe.xadd(DEAD_LETTER_STREAM, dict(fields, source_id=message_id))
+            pipe.xack(STREAM, GROUP, message_id)
+            pipe.execute()
+        else:
+            retry.append((message_id, fields))
+    return retry
+
+
+def _process(r, dispatch, messages):
+    """Dispatch stream entries, XACKing the ones that succeeded"""
+    for message_id, fields in messages:
+        try:
+            payload = fields[b'payload']
+            dispatch(orjson.loads(payload), payload)
+        except Exception:
+            # Left pending; claimed again once idle for CLAIM_IDLE_MS
+            logger.exception("Failed to process queued event %s", message_id)
+            continue
+
+        r.xack(STREAM, GROUP, message_id)